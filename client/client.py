@@ -1,6 +1,10 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import threading
 import time
+import json
+import os
 from rich.console import Console
 from rich.table import Table
 from rich.prompt import Prompt, IntPrompt
@@ -12,18 +16,43 @@ class TaskManagerClient:
         self.console = Console()
         self.middleware_url = "http://localhost:8000/connect"
         self.server_url: Optional[str] = None
+        self.write_url: Optional[str] = None  # primary server when replication is enabled
         self.user_id: Optional[str] = None
         self.username: Optional[str] = None
         self.console_lock = threading.Lock()
         self.chat_refresh_interval = 3  # seconds
+        self.http = self.create_session()
+        # Local on-disk copy of the user's tasks, kept up to date from the server's change feed
+        self.replica_dir = os.path.join(os.path.expanduser("~"), ".taskmanager")
+        self.replica: Dict = {"seq": None, "tasks": {}}
+
+    @staticmethod
+    def create_session() -> requests.Session:
+        """HTTP session that backs off and retries when a server sheds load (429/503 + Retry-After)"""
+        retry = Retry(
+            total=4,
+            connect=2,
+            read=0,  # never replay a request the server may already have processed
+            status=3,
+            status_forcelist=[429, 503],
+            allowed_methods=None,  # rejected requests were never executed, so POSTs are safe to retry
+            respect_retry_after_header=True,
+            backoff_factor=0.5,
+            raise_on_status=False,
+        )
+        session = requests.Session()
+        session.mount("http://", HTTPAdapter(max_retries=retry))
+        return session
 
     def connect_to_server(self) -> bool:
         """Connect to an available server through the load balancer"""
         try:
-            response = requests.get(self.middleware_url, timeout=5)  # Sends a GET request
+            response = self.http.get(self.middleware_url, timeout=5)  # Sends a GET request
             response.raise_for_status()  # Raises an exception for bad HTTP responses (e.g., 404)
             data = response.json()  # Parse the JSON response to get host and port
             self.server_url = f"http://{data['host']}:{data['port']}"  # Construct server URL
+            primary = data.get("primary")  # present when servers replicate; writes go there
+            self.write_url = f"http://{primary['host']}:{primary['port']}" if primary else self.server_url
             self.console.print(Panel.fit(
                 f"[green]Connected to server: [bold]{self.server_url}[/bold][/green]",
                 title="Connection Established"
@@ -50,8 +79,8 @@ class TaskManagerClient:
             return None, None
 
         try:
-            response = requests.post(
-                f"{self.server_url}/user/register",
+            response = self.http.post(
+                f"{self.write_url}/user/register",
                 json={"username": username},
                 timeout=5
             )
@@ -78,7 +107,7 @@ class TaskManagerClient:
             return None, None
 
         try:
-            response = requests.post(
+            response = self.http.post(
                 f"{self.server_url}/user/login",
                 json={"user_id": user_id},
                 timeout=5
@@ -110,8 +139,8 @@ class TaskManagerClient:
             return
 
         try:
-            response = requests.post(
-                f"{self.server_url}/task/create",
+            response = self.http.post(
+                f"{self.write_url}/task/create",
                 json={"title": title, "owner_id": self.user_id},
                 timeout=5
             )
@@ -124,25 +153,107 @@ class TaskManagerClient:
         except Exception as e:
             self.console.print(f"[red]Error creating task:[/red] {str(e)}")
 
+    def replica_path(self) -> str:
+        return os.path.join(self.replica_dir, f"{self.user_id}.json")
+
+    def load_replica(self) -> None:
+        """Load the local task replica saved by a previous session"""
+        self.replica = {"seq": None, "tasks": {}}
+        try:
+            with open(self.replica_path(), "r") as f:
+                data = json.load(f)
+            if isinstance(data.get("seq"), int) and isinstance(data.get("tasks"), dict):
+                self.replica = {"seq": data["seq"], "tasks": data["tasks"]}
+        except (OSError, ValueError):
+            pass  # no usable replica yet; the first sync downloads everything
+
+    def save_replica(self) -> None:
+        try:
+            os.makedirs(self.replica_dir, exist_ok=True)
+            tmp_path = self.replica_path() + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.replica, f)
+            os.replace(tmp_path, self.replica_path())
+        except OSError as e:
+            self.console.print(f"[yellow]Could not save local task copy:[/yellow] {str(e)}")
+
+    def apply_change(self, change: Dict) -> None:
+        """Apply one entry of the /changes feed to the local replica"""
+        tasks = self.replica["tasks"]
+        task_id = change["task_id"]
+        op = change["op"]
+
+        if op == "full":
+            tasks[task_id] = change["task"]
+        elif op == "drop":
+            tasks.pop(task_id, None)
+        elif op == "task":
+            tasks.setdefault(task_id, {"id": task_id, "chat": []}).update(change["task"])
+        elif op == "chat" and task_id in tasks:
+            chat = tasks[task_id].setdefault("chat", [])
+            if change["index"] == len(chat):
+                chat.append(change["message"])
+            elif change["index"] > len(chat):
+                # Missed messages locally: fetch this task's whole chat once
+                response = self.http.get(f"{self.server_url}/chat/get", params={"task_id": task_id, "user_id": self.user_id}, timeout=5)
+                if response.ok:
+                    tasks[task_id]["chat"] = response.json()
+
+    def sync_tasks(self) -> None:
+        """Fetch only the changes since the last sync and apply them to the local replica"""
+        more = True
+        while more:
+            response = self.http.get(
+                f"{self.write_url or self.server_url}/changes",  # the feed is kept by the primary
+                params={"user_id": self.user_id, "since": self.replica["seq"]},
+                timeout=10
+            )
+            response.raise_for_status()
+            data = response.json()
+            if data.get("reset"):
+                self.replica["tasks"] = data.get("tasks", {})
+            for change in data.get("changes", []):
+                self.apply_change(change)
+            self.replica["seq"] = data["seq"]
+            more = data.get("more", False)
+        self.save_replica()
+
     def list_tasks(self) -> List[Dict]:
-        """Retrieve and display user's tasks"""
+        """Sync and return the user's tasks from the local replica"""
         if not self.user_id:
             return []
 
         try:
-            response = requests.get(
-                f"{self.server_url}/task/list",
+            self.sync_tasks()
+        except Exception as e:
+            self.console.print(f"[red]Error syncing tasks (showing local copy):[/red] {str(e)}")
+
+        return [self.replica["tasks"][tid] for tid in sorted(self.replica["tasks"])]
+
+    def display_stats(self) -> None:
+        """Show the user's task counters (kept up to date by the server, no task scan)"""
+        try:
+            response = self.http.get(
+                f"{self.server_url}/task/stats",
                 params={"user_id": self.user_id},
                 timeout=5
             )
-            if response.ok:
-                return response.json()
-            else:
-                self.console.print(f"[red]Failed to retrieve tasks:[/red] {response.text}")
-        except Exception as e:
-            self.console.print(f"[red]Error fetching tasks:[/red] {str(e)}")
-        
-        return []
+            if not response.ok:
+                return
+            stats = response.json()["user"]
+        except Exception:
+            return  # the header is optional; the task table still shows everything
+
+        member = stats.get("member", {})
+        owned = sum(stats.get("owned", {}).values())
+        messages = sum(stats.get("chat_counts", {}).values())
+        self.console.print(Panel.fit(
+            f"[yellow]Pending: {member.get('Pending', 0)}[/yellow] | "
+            f"[blue]In Progress: {member.get('In Progress', 0)}[/blue] | "
+            f"[green]Done: {member.get('Done', 0)}[/green] | "
+            f"Owned: {owned} | Messages: {messages}",
+            title=f"{self.username or 'Your'} tasks"
+        ))
 
     def display_tasks(self, tasks: List[Dict]) -> None:
         """Display tasks in a rich table"""
@@ -169,12 +280,46 @@ class TaskManagerClient:
 
         self.console.print(table)
 
+    def search_tasks(self) -> None:
+        """Full-text search over the titles and chats of the user's tasks"""
+        query = Prompt.ask("Search for").strip()
+        if not query:
+            return
+
+        try:
+            response = self.http.get(
+                f"{self.server_url}/task/search",
+                params={"user_id": self.user_id, "q": query, "limit": 20},
+                timeout=5
+            )
+            if not response.ok:
+                self.console.print(f"[red]Search failed:[/red] {response.text}")
+                return
+            result = response.json()
+        except Exception as e:
+            self.console.print(f"[red]Error searching:[/red] {str(e)}")
+            return
+
+        table = Table(title=f"Results for '{query}' ({result['total']})", show_header=True, header_style="bold magenta")
+        table.add_column("Task ID", style="cyan", no_wrap=True)
+        table.add_column("Task", style="green")
+        table.add_column("Match")
+
+        for hit in result["hits"]:
+            if hit["type"] == "message":
+                match = f"{hit.get('username') or 'Unknown'}: {hit['message']} [dim]{hit.get('timestamp', '')}[/dim]"
+            else:
+                match = "[dim](task title)[/dim]"
+            table.add_row(hit["task_id"], hit["title"], match)
+
+        self.console.print(table)
+
     # (top parts of the class remain unchanged...)
 
     def get_username(self, user_id: str) -> str:
         """Fetch username from user ID"""
         try:
-            response = requests.get(f"{self.server_url}/user/info", params={"user_id": user_id}, timeout=5)
+            response = self.http.get(f"{self.server_url}/user/info", params={"user_id": user_id}, timeout=5)
             if response.ok:
                 return response.json().get("username", "Unknown")
         except Exception:
@@ -193,16 +338,17 @@ class TaskManagerClient:
         chat_stop_flag = threading.Event()
         last_chat = []
 
-        def fetch_chat() -> List[Dict]:
+        def fetch_chat(after: int = 0, wait: float = 0) -> Optional[List[Dict]]:
+            """Messages after index `after`; with `wait` the server holds the request until one arrives"""
             try:
-                response = requests.get(
+                response = self.http.get(
                     f"{self.server_url}/chat/get",
-                    params={"task_id": task["id"]},
-                    timeout=3
+                    params={"task_id": task["id"], "user_id": self.user_id, "after": after, "wait": wait},
+                    timeout=wait + 3
                 )
-                return response.json() if response.ok else []
+                return response.json() if response.ok else None
             except Exception:
-                return []
+                return None
 
         def print_chat(messages: List[Dict]) -> None:
             with self.console_lock:
@@ -218,15 +364,17 @@ class TaskManagerClient:
         def auto_refresh() -> None:
             nonlocal last_chat
             while not chat_stop_flag.is_set():
-                current_chat = fetch_chat()
-                new_messages = current_chat[len(last_chat):]
-                if new_messages:
+                # Long-poll: returns as soon as a new message is sent on any server
+                new_messages = fetch_chat(after=len(last_chat), wait=self.chat_refresh_interval)
+                if new_messages is None:
+                    time.sleep(self.chat_refresh_interval)
+                elif new_messages and not chat_stop_flag.is_set():
                     print_chat(new_messages)
-                    last_chat = current_chat
-                time.sleep(self.chat_refresh_interval)
+                    last_chat = last_chat + new_messages
+                    task["chat"] = last_chat  # keep the local replica current
 
-        # Initial chat display
-        last_chat = fetch_chat()
+        # Initial chat display from the local replica; the refresh thread fetches anything newer
+        last_chat = list(task.get("chat") or [])
         if last_chat:
             self.console.print(Panel.fit("[bold]Chat History[/bold]"))
             print_chat(last_chat)
@@ -257,8 +405,8 @@ class TaskManagerClient:
                     message = Prompt.ask("Your message").strip()
                     if message:
                         try:
-                            response = requests.post(
-                                f"{self.server_url}/chat/send",
+                            response = self.http.post(
+                                f"{self.write_url}/chat/send",
                                 json={
                                     "task_id": task["id"],
                                     "user_id": self.user_id,
@@ -274,8 +422,8 @@ class TaskManagerClient:
                 elif choice == 2:
                     new_status = Prompt.ask("New status", choices=["Pending", "In Progress", "Done"], default=task["status"])
                     try:
-                        response = requests.post(
-                            f"{self.server_url}/task/status",
+                        response = self.http.post(
+                            f"{self.write_url}/task/status",
                             json={"task_id": task["id"], "status": new_status},
                             timeout=5
                         )
@@ -291,8 +439,8 @@ class TaskManagerClient:
                     user_id = Prompt.ask("Enter User ID to assign").strip()
                     if user_id:
                         try:
-                            response = requests.post(
-                                f"{self.server_url}/task/assign",
+                            response = self.http.post(
+                                f"{self.write_url}/task/assign",
                                 json={"task_id": task["id"], "user_id": user_id, "actor_id": self.user_id},
                                 timeout=5
                             )
@@ -307,8 +455,8 @@ class TaskManagerClient:
                     user_id = Prompt.ask("Enter User ID to remove").strip()
                     if user_id:
                         try:
-                            response = requests.post(
-                                f"{self.server_url}/task/remove",
+                            response = self.http.post(
+                                f"{self.write_url}/task/remove",
                                 json={"task_id": task["id"], "user_id": user_id, "actor_id": self.user_id},
                                 timeout=5
                             )
@@ -325,17 +473,20 @@ class TaskManagerClient:
         finally:
             chat_stop_flag.set()
             refresh_thread.join()
+            self.save_replica()
 
 
     def dashboard(self) -> None:
         """Main user dashboard"""
         while True:
             tasks = self.list_tasks()
+            self.display_stats()
             self.display_tasks(tasks)
 
             options = [
                 "Create new task",
                 "View task details" if tasks else None,
+                "Search tasks and messages" if tasks else None,
                 "Logout"
             ]
             options = [opt for opt in options if opt is not None]
@@ -358,6 +509,8 @@ class TaskManagerClient:
                     self.view_task(selected_task)
                 else:
                     self.console.print("[red]Invalid Task ID[/red]")
+            elif choice == 3 and tasks:
+                self.search_tasks()
             elif choice == len(options):
                 self.user_id = None
                 self.username = None
@@ -382,10 +535,12 @@ class TaskManagerClient:
             if choice == 1:  # Register
                 self.user_id, self.username = self.register()
                 if self.user_id:
+                    self.load_replica()
                     self.dashboard()
             elif choice == 2:  # Login
                 self.user_id, self.username = self.login()
                 if self.user_id:
+                    self.load_replica()
                     self.dashboard()
             elif choice == 3:  # Exit
                 self.console.print("[bold]Goodbye![/bold]")
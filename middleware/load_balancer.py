@@ -1,27 +1,44 @@
 from flask import Flask, request, jsonify
+from collections import deque
 import random
+import threading
 
 app = Flask(__name__)
 
 # List of available server instances
 servers = []
 
+# --- Change notifications (pub/sub between servers) ---
+# Servers publish task/user change events here and long-poll for events from the
+# other servers. Events are kept in a bounded, sequence-numbered buffer.
+EVENT_BUFFER_SIZE = 5000
+MAX_POLL_TIMEOUT = 30  # seconds
+
+events = deque(maxlen=EVENT_BUFFER_SIZE)
+event_seq = 0
+event_cond = threading.Condition()
+
 @app.route("/register", methods=["POST"])
 def register_server():
     """Register a new server with the middleware"""
     data = request.json
     host = data.get("host")
     port = data.get("port")
+    role = data.get("role", "standalone")  # "standalone", "primary" or "replica"
 
     if not host or not port:
         return jsonify({"error": "host and port required"}), 400
 
-    server = {"host": host, "port": port}
+    server = {"host": host, "port": port, "role": role}
 
     # Register the server if it's not already in the list
-    if server not in servers:
+    existing = next((s for s in servers if s["host"] == host and s["port"] == port), None)
+    if existing is None:
         servers.append(server)
-        print(f"[+] Registered new server: {host}:{port}")
+        print(f"[+] Registered new server: {host}:{port} ({role})")
+    elif existing != server:
+        existing.update(server)
+        print(f"[!] Server {host}:{port} re-registered as {role}.")
     else:
         print(f"[!] Server {host}:{port} is already registered.")
     
@@ -33,8 +50,13 @@ def connect():
     if not servers:
         return jsonify({"error": "No available servers"}), 500
 
-    # Randomly select a server from the list of registered servers
-    selected_server = random.choice(servers)
+    # Randomly select a server from the list of registered servers; any server can serve reads
+    selected_server = dict(random.choice(servers))
+
+    # With replication, writes must go to the primary
+    primary = next((s for s in servers if s["role"] == "primary"), None)
+    if primary is not None:
+        selected_server["primary"] = {"host": primary["host"], "port": primary["port"]}
     return jsonify(selected_server), 200
 
 # for debugging
@@ -48,5 +70,51 @@ def health():
     """Health check endpoint to ensure the middleware is running."""
     return jsonify({"status": "Healthy"}), 200
 
+@app.route("/events/publish", methods=["POST"])
+def publish_events():
+    """Append events published by a server and wake up subscribers"""
+    global event_seq
+    data = request.json or {}
+    source = data.get("source")
+    batch = data.get("events")
+
+    if not source or not isinstance(batch, list):
+        return jsonify({"error": "source and events required"}), 400
+
+    with event_cond:
+        for event in batch:
+            event_seq += 1
+            events.append({
+                "seq": event_seq,
+                "source": source,
+                "topic": event.get("topic"),
+                "data": event.get("data", {})
+            })
+        event_cond.notify_all()
+        seq = event_seq
+
+    return jsonify({"seq": seq}), 200
+
+@app.route("/events/poll", methods=["GET"])
+def poll_events():
+    """Long-poll for events after `since`; waits up to `timeout` seconds for new ones"""
+    since = request.args.get("since", type=int)
+    timeout = min(request.args.get("timeout", 20, type=float), MAX_POLL_TIMEOUT)
+
+    with event_cond:
+        if since is None:
+            # New subscriber: start from the current position
+            return jsonify({"seq": event_seq, "events": []}), 200
+
+        if since <= event_seq:
+            event_cond.wait_for(lambda: event_seq > since, timeout=timeout)
+        oldest = events[0]["seq"] if events else event_seq + 1
+        if since > event_seq or since < oldest - 1:
+            # Subscriber missed events (buffer overflow or middleware restart)
+            return jsonify({"seq": event_seq, "events": [], "reset": True}), 200
+        new_events = [e for e in events if e["seq"] > since]
+
+    return jsonify({"seq": event_seq, "events": new_events}), 200
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8000)
+    app.run(host="0.0.0.0", port=8000, threaded=True)
@@ -0,0 +1,219 @@
+"""Bulk import/export of users, tasks, memberships and chat messages as JSON Lines.
+
+Usage (from the taskmanager folder):
+    python -m server.bulk export backup.jsonl
+    python -m server.bulk import backup.jsonl [--batch-size 10000] [--resume]
+
+One JSON object per line:
+    {"type": "user", "id": ..., "name": ...}
+    {"type": "task", "id": ..., "title": ..., "owner_id": ..., "status": ...}
+    {"type": "member", "task_id": ..., "user_id": ...}
+    {"type": "chat", "task_id": ..., "index": ..., "user_id": ..., "username": ..., "message": ..., "timestamp": ...}
+
+The input file is streamed and applied in batches through the server's storage
+layer (load_json_safe / save_json_safe). Every batch rewrites the whole files, so a
+batch is at least as many records as there are tasks and users already: batches
+grow with the database and the total work stays linear in the input. After every
+batch the byte offset reached is saved to <input>.checkpoint, so an interrupted
+import continues with --resume. Records are idempotent (chat messages carry their
+position), so re-applying the last batch after a crash does not duplicate anything.
+A chat message whose position is past the end of its chat (an earlier message is
+missing) is skipped rather than stored out of place.
+
+Run imports while the servers are stopped, or restart them afterwards: their
+in-memory search index and statistics are built from the database on startup.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from server.services.utils import load_json_safe, load_json_snapshot, save_json_safe, data_path
+from server.services.changes import reset_change_feed
+from server.services.records import TASK_DB
+
+USER_DB = data_path("server", "data", "users.json")
+
+DEFAULT_BATCH_SIZE = 10000
+PROGRESS_EVERY = 2  # seconds between progress lines
+STATUSES = ("Pending", "In Progress", "Done")
+
+
+class Progress:
+    def __init__(self, action):
+        self.action = action
+        self.count = 0
+        self.started = self.last = time.monotonic()
+
+    def add(self, n=1):
+        self.count += n
+        now = time.monotonic()
+        if now - self.last >= PROGRESS_EVERY:
+            self.last = now
+            self.report()
+
+    def report(self, final=False):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        label = "done" if final else "..."
+        print(f"[{self.action}] {self.count} records, {self.count / elapsed:.0f}/s {label}", file=sys.stderr)
+
+
+# --- export ---
+def export_records():
+    """Yield export records one at a time."""
+    for user_id, user in load_json_snapshot(USER_DB).items():
+        yield {"type": "user", "id": user_id, "name": user.get("name", "")}
+
+    for task_id, task in load_json_snapshot(TASK_DB).items():
+        yield {
+            "type": "task",
+            "id": task_id,
+            "title": task.title,
+            "owner_id": task.owner_id,
+            "status": task.status,
+        }
+        for user_id in task.member_ids():
+            yield {"type": "member", "task_id": task_id, "user_id": user_id}
+        for index in range(len(task.chat)):
+            yield {"type": "chat", "task_id": task_id, "index": index, **task.chat.message(index)}
+
+
+def export_jsonl(path):
+    progress = Progress("export")
+    with open(path, "w", encoding="utf-8") as out:
+        for record in export_records():
+            out.write(json.dumps(record) + "\n")
+            progress.add()
+    progress.report(final=True)
+
+
+# --- import ---
+def is_id(value):
+    return isinstance(value, str) and value != ""
+
+
+def apply_record(record, users, tasks):
+    """Apply one record to the in-memory documents. Returns False if it was skipped."""
+    kind = record.get("type")
+    owner_id = record.get("owner_id")
+
+    if kind == "user" and is_id(record.get("id")):
+        users[record["id"]] = {"id": record["id"], "name": record.get("name", "")}
+
+    elif kind == "task" and is_id(record.get("id")) and (owner_id is None or isinstance(owner_id, str)):
+        task = tasks.setdefault(record["id"], {"title": "", "owner_id": None, "status": "Pending", "members": [], "chat": []})
+        task["title"] = record.get("title", "Untitled")
+        task["owner_id"] = owner_id or "unknown"
+        task["status"] = record.get("status") if record.get("status") in STATUSES else "Pending"
+        if task["owner_id"] not in task["members"]:
+            task["members"].insert(0, task["owner_id"])
+
+    elif kind == "member" and is_id(record.get("task_id")) and record["task_id"] in tasks and is_id(record.get("user_id")):
+        members = tasks[record["task_id"]]["members"]
+        if record["user_id"] not in members:
+            members.append(record["user_id"])
+
+    elif kind == "chat" and is_id(record.get("task_id")) and record["task_id"] in tasks and is_id(record.get("user_id")):
+        chat = tasks[record["task_id"]]["chat"]
+        index = record.get("index")
+        if isinstance(index, int) and index < len(chat):
+            return True  # already imported
+        if isinstance(index, int) and index > len(chat):
+            return False  # earlier messages are missing: appending would misplace it
+        chat.append({
+            "user_id": record.get("user_id"),
+            "username": record.get("username", "Unknown"),
+            "message": record.get("message", ""),
+            "timestamp": record.get("timestamp", ""),
+        })
+
+    else:
+        return False
+    return True
+
+
+def read_checkpoint(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"offset": 0, "records": 0}
+
+
+def write_checkpoint(path, offset, records):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"offset": offset, "records": records}, f)
+    os.replace(tmp_path, path)
+
+
+def import_jsonl(path, batch_size=DEFAULT_BATCH_SIZE, resume=False):
+    checkpoint_path = path + ".checkpoint"
+    checkpoint = read_checkpoint(checkpoint_path) if resume else {"offset": 0, "records": 0}
+    if checkpoint["offset"]:
+        print(f"[import] resuming after {checkpoint['records']} records", file=sys.stderr)
+
+    users = load_json_safe(USER_DB)
+    tasks = load_json_safe(TASK_DB)
+    progress = Progress("import")
+    progress.count = checkpoint["records"]
+    skipped = 0
+    pending = 0
+
+    def commit(offset):
+        nonlocal users, tasks
+        save_json_safe(TASK_DB, tasks)
+        save_json_safe(USER_DB, users)
+        write_checkpoint(checkpoint_path, offset, progress.count)
+        # save_json_safe hands the documents to readers; continue on private copies
+        users = load_json_safe(USER_DB)
+        tasks = load_json_safe(TASK_DB)
+
+    with open(path, "rb") as f:
+        f.seek(checkpoint["offset"])
+        for line in iter(f.readline, b""):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if not isinstance(record, dict) or not apply_record(record, users, tasks):
+                skipped += 1
+            progress.add()
+            pending += 1
+            if pending >= max(batch_size, len(tasks) + len(users)):
+                commit(f.tell())
+                pending = 0
+        commit(f.tell())
+
+    # Clients' local replicas do not know about imported data: make them resync
+    reset_change_feed()
+    progress.report(final=True)
+    if skipped:
+        print(f"[import] skipped {skipped} invalid records (e.g. non-string ids), records for unknown tasks or chat messages after a gap", file=sys.stderr)
+    os.remove(checkpoint_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import/export of task manager data as JSON Lines")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_cmd = commands.add_parser("export", help="write all users, tasks, members and chats")
+    export_cmd.add_argument("path")
+
+    import_cmd = commands.add_parser("import", help="load records into the database")
+    import_cmd.add_argument("path")
+    import_cmd.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    import_cmd.add_argument("--resume", action="store_true", help="continue an interrupted import")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        export_jsonl(args.path)
+    else:
+        import_jsonl(args.path, max(1, args.batch_size), args.resume)
+
+
+if __name__ == "__main__":
+    main()
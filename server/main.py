@@ -2,17 +2,35 @@ from flask import Flask, jsonify
 from server.services.user_service import user_bp
 from server.services.task_service import task_bp
 from server.services.chat_service import chat_bp
+from server.services.changes import changes_bp
+from server.services.replication import replication_bp, init_replication
+from server.services.profiling import admin_bp, init_profiling
+from server.services.rate_limit import init_admission_control
+from server.services.utils import set_node_id, MAX_NODE_ID
+from server.services import events, task_service, user_service
 
-import sys
+import argparse
 import threading
 import requests
 
+MIDDLEWARE_URL = "http://localhost:8000"
+NODE_PORT_BASE = 5000  # without --node-id, ports 5000-9095 give node ids 0-4095
+
 app = Flask(__name__)
 
 # Register all service blueprints
 app.register_blueprint(user_bp, url_prefix="/user")
 app.register_blueprint(task_bp, url_prefix="/task")
 app.register_blueprint(chat_bp, url_prefix="/chat")
+app.register_blueprint(changes_bp, url_prefix="/changes")
+app.register_blueprint(replication_bp, url_prefix="/replication")
+app.register_blueprint(admin_bp, url_prefix="/admin")
+
+# Request timing, slow-request log and on-demand profiler (see /admin)
+init_profiling(app)
+
+# Rate limiting and load shedding for every route except /health
+init_admission_control(app)
 
 # Health check
 @app.route("/health", methods=["GET"])
@@ -20,11 +38,11 @@ def health_check():
     return jsonify({"status": "ok"}), 200
 
 # register with middleware
-def register_with_middleware(server_port):
+def register_with_middleware(server_port, role):
     try:
         response = requests.post(
-            "http://localhost:8000/register",  # middleware must be running
-            json={"host": "localhost", "port": server_port},
+            f"{MIDDLEWARE_URL}/register",  # middleware must be running
+            json={"host": "localhost", "port": server_port, "role": role},
             timeout=3
         )
         if response.status_code == 200:
@@ -35,14 +53,42 @@ def register_with_middleware(server_port):
         print(f"[!] Middleware registration error: {e}")
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python main.py <port>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Task manager server")
+    parser.add_argument("port", type=int)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--primary", action="store_true",
+                       help="accept writes and stream them to replicas")
+    group.add_argument("--replica-of", metavar="HOST:PORT",
+                       help="serve reads from a local copy kept in sync with this primary")
+    parser.add_argument("--node-id", type=int,
+                        help=f"id of this server inside generated IDs (0-{MAX_NODE_ID}), different for "
+                             f"every server; defaults to port - {NODE_PORT_BASE}")
+    args = parser.parse_args()
+
+    port = args.port
+    try:
+        # Keeps IDs generated by different servers apart
+        set_node_id(args.node_id if args.node_id is not None else port - NODE_PORT_BASE)
+    except ValueError as e:
+        if args.node_id is not None:
+            parser.error(str(e))
+        parser.error(f"port {port} gives no node id (ports {NODE_PORT_BASE}-{NODE_PORT_BASE + MAX_NODE_ID} do); "
+                     f"pass a unique --node-id between 0 and {MAX_NODE_ID}")
+
+    if args.replica_of:
+        role = "replica"
+        init_replication(app, role, primary_url=f"http://{args.replica_of}")
+    elif args.primary:
+        role = "primary"
+        init_replication(app, role, files=[task_service.TASK_DB, user_service.USER_DB])
+    else:
+        role = "standalone"
 
-    port = int(sys.argv[1])
+    # Change notifications from/to the other servers, relayed by the middleware
+    events.start(f"localhost:{port}", MIDDLEWARE_URL)
 
     # Optional registration
-    threading.Thread(target=register_with_middleware, args=(port,), daemon=True).start()
+    threading.Thread(target=register_with_middleware, args=(port, role), daemon=True).start()
 
     # Run Flask app with threading enabled
     app.run(host="0.0.0.0", port=port, threaded=True)
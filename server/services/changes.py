@@ -0,0 +1,196 @@
+from flask import Blueprint, request, jsonify
+from collections import deque
+from itertools import islice
+import json
+import os
+import threading
+import fasteners
+from server.services.utils import load_json_snapshot, write_atomic, data_path
+from server.services.records import TASK_DB
+
+# Change feed for delta sync.
+#
+# Every task mutation gets the next value of a monotonically increasing change
+# sequence and is appended as one JSON line to CHANGE_LOG. Handlers record the
+# change while they still hold the task DB write lock, so the feed has exactly the
+# saved states, in the order they were saved. Clients call
+# /changes?user_id=<id>&since=<seq> and receive only the changes to tasks they
+# belong to, then continue from the returned seq.
+
+changes_bp = Blueprint("changes", __name__)
+CHANGE_LOG = data_path("db", "changes.jsonl")
+CHANGE_LOCK_FILE = CHANGE_LOG + ".lock"
+
+CHANGE_LOG_LIMIT = 5000  # older changes are dropped; clients that far behind resync
+MAX_CHANGES_PER_RESPONSE = 500
+TASK_FIELDS = ("title", "status", "owner_id", "members")
+
+os.makedirs(os.path.dirname(CHANGE_LOG), exist_ok=True)
+
+
+class ChangeFeed:
+    """Append-only change log in a JSON-lines file; the newest `limit` entries are kept in memory.
+
+    Servers sharing the file append under an inter-process lock and pick up each
+    other's entries by reading what was appended since they last looked. The file is
+    rewritten only to drop old entries, once it holds twice as many as are kept.
+    """
+
+    def __init__(self, path, limit):
+        self.path = path
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.entries = deque(maxlen=limit)
+        self.seq = 0
+        self.reset_seq = 0  # clients that synced before this seq must resync
+        self.inode = None
+        self.offset = 0  # bytes of the file read so far
+        self.lines = 0
+
+    def refresh(self):
+        """Read entries appended since the last call (by any server). Caller holds self.lock."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return 0
+        if st.st_ino != self.inode or st.st_size < self.offset:
+            # New or compacted file: start over
+            self.entries.clear()
+            self.inode, self.offset, self.lines, self.reset_seq = st.st_ino, 0, 0, 0
+        if st.st_size > self.offset:
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                chunk = f.read(st.st_size - self.offset)
+            end = chunk.rfind(b"\n") + 1  # a line still being written is read next time
+            for line in chunk[:end].splitlines():
+                self.lines += 1
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    print(f"[Warning] Skipping unreadable line in {self.path}")
+                    continue
+                if isinstance(entry, dict) and isinstance(entry.get("seq"), int):
+                    self.add(entry)
+            self.offset += end
+        return st.st_size
+
+    def add(self, entry):
+        self.entries.append(entry)
+        self.seq = entry["seq"]
+        if entry.get("op") == "reset":
+            self.reset_seq = entry["seq"]
+
+    def append(self, **entry):
+        """Give `entry` the next seq and append it to the file; returns the seq."""
+        with self.lock, fasteners.InterProcessLock(CHANGE_LOCK_FILE):
+            size = self.refresh()
+            entry = {"seq": self.seq + 1, **entry}
+            line = json.dumps(entry).encode("utf-8") + b"\n"
+            if size > self.offset:
+                line = b"\n" + line  # end the partial line a crashed writer left behind
+            with open(self.path, "ab") as f:
+                f.write(line)
+                self.inode = os.fstat(f.fileno()).st_ino
+            self.offset = size + len(line)
+            self.lines += 1
+            self.add(entry)
+            if self.lines > 2 * self.limit:
+                self.compact()
+            return entry["seq"]
+
+    def compact(self):
+        """Rewrite the file with only the entries kept in memory. Caller holds both locks."""
+        raw = b"".join(json.dumps(entry).encode("utf-8") + b"\n" for entry in self.entries)
+        write_atomic(self.path, raw)
+        self.inode = os.stat(self.path).st_ino
+        self.offset, self.lines = len(raw), len(self.entries)
+
+    def read(self, since):
+        """(entries after `since`, current seq); entries is None if the client must resync."""
+        with self.lock:
+            self.refresh()
+            oldest = self.entries[0]["seq"] if self.entries else self.seq + 1
+            if since is None or since > self.seq or since < oldest - 1 or since < self.reset_seq:
+                return None, self.seq
+            # Seqs are consecutive, so the position follows from the seq
+            start = since - oldest + 1
+            return list(islice(self.entries, start, None)), self.seq
+
+
+change_feed = ChangeFeed(CHANGE_LOG, CHANGE_LOG_LIMIT)
+
+
+def record_change(task_id, op, members, **data):
+    """Append a change to the feed. `members` are the task members who may see it.
+
+    Call it while still holding the task DB write lock (inside update_json()), right after the save.
+    """
+    return change_feed.append(task_id=task_id, op=op, members=list(members), **data)
+
+
+def record_task_change(task_id, task, added=None, removed=None):
+    """Record the new state of a task's metadata (create, status, assign, remove)."""
+    fields = {field: task.get(field) for field in TASK_FIELDS}
+    members = set(task.get("members", []))
+    if removed:
+        members.add(removed)  # the removed user must learn they lost access
+    return record_change(task_id, "task", members, task=fields, added=added, removed=removed)
+
+
+def record_chat_change(task_id, task, index, message):
+    """Record a chat message appended at position `index`."""
+    return record_change(task_id, "chat", task.get("members", []), index=index, message=message)
+
+
+def reset_change_feed():
+    """Make every client do a full resync on its next /changes call."""
+    change_feed.append(op="reset", members=[])
+
+
+def full_task(task_id, record):
+    return {"id": task_id, **record.to_dict()}
+
+
+@changes_bp.route("", methods=["GET"])
+def get_changes():
+    user_id = request.args.get("user_id")
+    since = request.args.get("since", type=int)  # omitted on a client's first sync
+
+    if not user_id:
+        return jsonify({"error": "Missing user_id"}), 400
+
+    entries, current = change_feed.read(since)
+
+    if entries is None:
+        # First sync, or the client is too far behind: send all of the user's tasks
+        tasks = load_json_snapshot(TASK_DB)
+        user_tasks = {
+            tid: full_task(tid, task) for tid, task in tasks.items()
+            if task.has_member(user_id)
+        }
+        return jsonify({"seq": current, "reset": True, "tasks": user_tasks, "changes": []}), 200
+
+    tasks = None
+    changes = []
+    seq = since
+    for entry in entries:
+        if len(changes) >= MAX_CHANGES_PER_RESPONSE:
+            break
+        seq = entry["seq"]
+        if user_id not in entry.get("members", []):
+            continue
+
+        task_id = entry["task_id"]
+        if entry["op"] == "task" and entry.get("removed") == user_id:
+            changes.append({"seq": seq, "op": "drop", "task_id": task_id})
+        elif entry["op"] == "task" and entry.get("added") == user_id:
+            # Newly assigned: the client has none of this task yet, send all of it
+            tasks = tasks if tasks is not None else load_json_snapshot(TASK_DB)
+            if task_id in tasks:
+                changes.append({"seq": seq, "op": "full", "task_id": task_id, "task": full_task(task_id, tasks[task_id])})
+        elif entry["op"] == "task":
+            changes.append({"seq": seq, "op": "task", "task_id": task_id, "task": entry["task"]})
+        elif entry["op"] == "chat":
+            changes.append({"seq": seq, "op": "chat", "task_id": task_id, "index": entry["index"], "message": entry["message"]})
+
+    return jsonify({"seq": seq, "reset": False, "changes": changes, "more": seq < current}), 200
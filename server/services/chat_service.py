@@ -1,15 +1,19 @@
 from flask import Blueprint, request, jsonify
 import os
 import datetime
-from server.services.utils import load_json_safe, save_json_safe
+import threading
+import time
+from server.services.utils import load_json_safe, load_json_snapshot, save_json_safe, update_json, data_path
+from server.services.rate_limit import release_admission
+from server.services import events
+from server.services.changes import record_chat_change
+from server.services.records import TASK_DB
 
 chat_bp = Blueprint("chat", __name__)
-TASK_DB = os.path.join("db", "tasks.json")
-USER_DB = os.path.join("server", "data", "users.json")  # Match user_service
+USER_DB = data_path("server", "data", "users.json")  # Match user_service
 
 # --- Ensure required files/directories exist ---
-if not os.path.exists("server/data"):
-    os.makedirs("server/data")
+os.makedirs(os.path.dirname(USER_DB), exist_ok=True)
 if not os.path.exists(USER_DB):
     save_json_safe(USER_DB, {})
 
@@ -31,6 +35,35 @@ def clean_chats():
 clean_chats()
 # ------------------------------------------------
 
+MAX_CHAT_WAIT = 25  # seconds a /chat/get long-poll may wait for new messages
+
+# --- Username cache, kept fresh by "user.registered" events ---
+usernames = {}
+usernames_lock = threading.Lock()
+usernames_loaded = False
+
+def get_usernames():
+    """user_id -> name, loaded from USER_DB once and then updated from events."""
+    global usernames_loaded
+    with usernames_lock:
+        if not usernames_loaded:
+            users = load_json_snapshot(USER_DB)
+            usernames.update({uid: u.get("name", "Unknown") for uid, u in users.items() if isinstance(u, dict)})
+            usernames_loaded = True
+        return usernames
+
+def on_user_event(topic, data):
+    global usernames_loaded
+    with usernames_lock:
+        if topic == "reset":
+            usernames.clear()
+            usernames_loaded = False
+        elif data.get("user_id"):
+            usernames[data["user_id"]] = data.get("name", "Unknown")
+
+events.subscribe("user.", on_user_event)
+events.subscribe("reset", on_user_event)
+
 
 @chat_bp.route("/send", methods=["POST"])
 def send_message():
@@ -42,18 +75,16 @@ def send_message():
     if not all([task_id, user_id, message]):
         return jsonify({"error": "Missing task_id, user_id or message"}), 400
 
-    tasks = load_json_safe(TASK_DB)
-    users = load_json_safe(USER_DB)
-    task = tasks.get(task_id)
+    # Membership is checked on the shared snapshot record before taking the write lock
+    record = load_json_snapshot(TASK_DB).get(task_id)
 
-    if not task:
+    if not record:
         return jsonify({"error": "Task not found"}), 404
 
-    if user_id not in task["members"]:
+    if not record.has_member(user_id):
         return jsonify({"error": "User not a member of this task"}), 403
 
-    if not isinstance(task.get("chat"), list):
-        task["chat"] = []
+    users = load_json_snapshot(USER_DB)
 
     # Retrieve the username from the users.json file
     user = users.get(user_id)
@@ -65,44 +96,65 @@ def send_message():
     # Debugging logs to verify the user and username
     print(f"User ID: {user_id} - User: {user} - Username: {username}")
 
-    # Add the new message with timestamp
-    task["chat"].append({
-        "user_id": user_id,
-        "username": username,
-        "message": message,
-        "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    })
+    with update_json(TASK_DB) as tx:
+        task = tx.data.get(task_id)
+        if not task or user_id not in task["members"]:
+            return jsonify({"error": "User not a member of this task"}), 403
 
-    # Save the updated tasks back
-    save_json_safe(TASK_DB, tasks)
+        if not isinstance(task.get("chat"), list):
+            task["chat"] = []
+
+        # Add the new message with timestamp
+        entry = {
+            "user_id": user_id,
+            "username": username,
+            "message": message,
+            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+        task["chat"].append(entry)
+
+        # Save the updated tasks back
+        tx.save(changed=[task_id])
+        record_chat_change(task_id, task, len(task["chat"]) - 1, entry)
+        events.publish("chat.sent", task_id=task_id, index=len(task["chat"]) - 1, **entry)
     return jsonify({"message": "Message sent"}), 200
 
 
 @chat_bp.route("/get", methods=["GET"])
 def get_chat():
     task_id = request.args.get("task_id")
+    # Optional long-poll: only return messages after index `after`, waiting up to `wait`
+    # seconds for new ones to arrive (woken by "chat.sent" events from any server)
+    after = request.args.get("after", 0, type=int)
+    wait = min(request.args.get("wait", 0, type=float), MAX_CHAT_WAIT)
 
     if not task_id:
         return jsonify({"error": "Missing task_id"}), 400
 
-    tasks = load_json_safe(TASK_DB)
-    users = load_json_safe(USER_DB)
-
+    seen_version = events.version(task_id)
+    tasks = load_json_snapshot(TASK_DB)
     task = tasks.get(task_id)
 
     if not task:
         return jsonify({"error": "Task not found"}), 404
 
+    if wait > 0 and len(task.chat) <= after:
+        # Waiting readers must not hold on to the server's concurrency budget
+        release_admission()
+        deadline = time.monotonic() + wait
+        while len(task.chat) <= after:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            # Re-check at least every second in case a change arrives without an event
+            seen_version = events.wait_for_change(task_id, seen_version, min(remaining, 1))
+            task = load_json_snapshot(TASK_DB).get(task_id, task)
+
+    users = get_usernames()
     chat_with_names = []
-    for msg in task.get("chat", []):
-        user_id = msg.get("user_id")
-        user_info = users.get(user_id, {})
-        chat_with_names.append({
-            "user_id": user_id,
-            "username": user_info.get("name", "Unknown"),
-            "message": msg.get("message", ""),
-            "timestamp": msg.get("timestamp", "")  # in case you add timestamps later
-        })
+    for msg in task.chat.to_list(after):
+        msg["username"] = users.get(msg["user_id"], msg["username"])
+        chat_with_names.append(msg)
 
     return jsonify(chat_with_names), 200
 
@@ -110,7 +162,7 @@ def get_chat():
 
 def update_existing_chat_usernames():
     tasks = load_json_safe(TASK_DB)
-    users = load_json_safe(USER_DB)
+    users = load_json_snapshot(USER_DB)
     updated = False
 
     for task in tasks.values():
@@ -0,0 +1,143 @@
+import queue
+import threading
+import time
+import requests
+
+# Cross-server change notifications.
+#
+# Handlers call publish() right after they save a task or user, while they still hold
+# the write lock (inside update_json()), so events only describe saved states and
+# leave in save order. The event is delivered to local subscribers right away and
+# forwarded to the middleware, which relays it
+# to every other server. Subscribers use events to keep in-memory state fresh and
+# to wake up readers waiting for changes, without re-reading the database.
+#
+# Topics:
+#   "user.registered"  {"user_id", "name"}
+#   "task.created"     {"task_id", ...}
+#   "task.changed"     {"task_id", ...}
+#   "chat.sent"        {"task_id", "index", ...}
+#   "reset"            {}  events may have been missed; drop all cached state
+
+POLL_TIMEOUT = 20  # seconds the middleware holds a poll open
+RETRY_DELAY = 2
+PUBLISH_BATCH = 100
+OUTBOX_LIMIT = 10000  # events held for the middleware while it is unreachable
+
+subscribers = []  # (topic prefix, callback)
+subscribers_lock = threading.Lock()
+
+# Per-key change counters so readers can wait for "something changed on task X"
+versions = {}
+versions_cond = threading.Condition()
+
+outbox = queue.Queue(maxsize=OUTBOX_LIMIT)
+lost_events = threading.Event()  # the outbox overflowed; peers must reset
+config = {"source": None, "middleware_url": None}
+
+
+def subscribe(topic_prefix, callback):
+    """Call callback(topic, data) for every local or remote event whose topic starts with topic_prefix."""
+    with subscribers_lock:
+        subscribers.append((topic_prefix, callback))
+
+
+def publish(topic, **data):
+    """Publish a change event to this server and, when connected, to all other servers."""
+    deliver(topic, data)
+    if config["middleware_url"]:
+        try:
+            outbox.put_nowait({"topic": topic, "data": data})
+        except queue.Full:
+            lost_events.set()
+
+
+def deliver(topic, data):
+    with subscribers_lock:
+        callbacks = [cb for prefix, cb in subscribers if topic.startswith(prefix)]
+    for callback in callbacks:
+        try:
+            callback(topic, data)
+        except Exception as e:
+            print(f"[!] Event subscriber failed on {topic}: {e}")
+
+    key = data.get("task_id") or data.get("user_id")
+    with versions_cond:
+        if key:
+            versions[key] = versions.get(key, 0) + 1
+        if topic == "reset":
+            for k in versions:
+                versions[k] += 1
+        versions_cond.notify_all()
+
+
+def version(key):
+    """Current change counter of a task/user id."""
+    with versions_cond:
+        return versions.get(key, 0)
+
+
+def wait_for_change(key, seen_version, timeout):
+    """Block until `key` changes past `seen_version` or the timeout expires. Returns the new version."""
+    with versions_cond:
+        versions_cond.wait_for(lambda: versions.get(key, 0) != seen_version, timeout=timeout)
+        return versions.get(key, 0)
+
+
+def start(source, middleware_url):
+    """Connect to the middleware event channel: forward local events and receive remote ones."""
+    config["source"] = source
+    config["middleware_url"] = middleware_url
+    threading.Thread(target=forward_events, daemon=True).start()
+    threading.Thread(target=receive_events, daemon=True).start()
+
+
+def forward_events():
+    batch = []
+    while True:
+        if not batch:
+            batch = [outbox.get()]
+            while len(batch) < PUBLISH_BATCH and not outbox.empty():
+                batch.append(outbox.get_nowait())
+        if lost_events.is_set():
+            # Some events never made it into the outbox: make the other servers drop
+            # their cached state and rebuild it from the database
+            lost_events.clear()
+            batch.append({"topic": "reset", "data": {}})
+        try:
+            requests.post(
+                f"{config['middleware_url']}/events/publish",
+                json={"source": config["source"], "events": batch},
+                timeout=3
+            ).raise_for_status()
+            batch = []
+        except Exception as e:
+            # Keep the batch and retry it; new events wait in the bounded outbox
+            print(f"[!] Could not publish {len(batch)} event(s), retrying: {e}")
+            time.sleep(RETRY_DELAY)
+
+
+def receive_events():
+    since = None
+    while True:
+        try:
+            params = {"timeout": POLL_TIMEOUT}
+            if since is not None:
+                params["since"] = since
+            response = requests.get(
+                f"{config['middleware_url']}/events/poll",
+                params=params,
+                timeout=POLL_TIMEOUT + 5
+            )
+            response.raise_for_status()
+            data = response.json()
+        except Exception:
+            time.sleep(RETRY_DELAY)
+            continue
+
+        if data.get("reset"):
+            deliver("reset", {})
+        for event in data.get("events", []):
+            if event["source"] != config["source"]:
+                deliver(event["topic"], event["data"])
+        since = data["seq"]
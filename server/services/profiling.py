@@ -0,0 +1,250 @@
+from flask import Blueprint, request, jsonify, Response
+from collections import Counter, deque
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from server.services.utils import data_path, get_io_stats, reset_io_stats
+
+# On-demand profiling of a live server and a log of slow requests.
+#
+#   POST /admin/profile/start  {"seconds": 30, "mode": "sample" | "cprofile", "every": 1, "interval_ms": 5}
+#   POST /admin/profile/stop
+#   GET  /admin/profile/result?format=collapsed | pstats
+#   GET  /admin/slow
+#
+# "sample" mode walks the stacks of threads that are serving requests every
+# interval_ms and returns collapsed stacks ("frame;frame;frame count"), the input
+# format of flamegraph.pl / speedscope. "cprofile" mode runs cProfile on one in
+# `every` requests and returns pstats output sorted by cumulative time.
+
+admin_bp = Blueprint("admin", __name__)
+
+SLOW_REQUEST_MS = 500
+SLOW_LOG_SIZE = 200
+SLOW_LOG_FILE = data_path("logs", "slow_requests.log")
+MAX_PROFILE_SECONDS = 300
+
+slow_requests = deque(maxlen=SLOW_LOG_SIZE)
+active_requests = {}  # thread ident -> endpoint, for the sampler
+active_lock = threading.Lock()
+
+
+class ProfileSession:
+    """One profiling run; results are kept until the next run starts."""
+
+    def __init__(self, mode, seconds, every, interval_ms):
+        self.mode = mode
+        self.seconds = seconds
+        self.every = max(1, every)
+        self.interval = max(1, interval_ms) / 1000
+        self.started = time.time()
+        self.stopped = None
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.profiled_requests = 0
+        self.samples = Counter()
+        self.stats = None
+        self.stop_event = threading.Event()
+
+    @property
+    def running(self):
+        return self.stopped is None
+
+    def start(self):
+        if self.mode == "sample":
+            threading.Thread(target=self.sample_loop, daemon=True).start()
+        timer = threading.Timer(self.seconds, self.stop)
+        timer.daemon = True
+        timer.start()
+
+    def stop(self):
+        with self.lock:
+            if self.stopped is None:
+                self.stopped = time.time()
+                self.stop_event.set()
+
+    # --- sampling mode ---
+    def sample_loop(self):
+        while not self.stop_event.wait(self.interval):
+            with active_lock:
+                busy = dict(active_requests)
+            frames = sys._current_frames()
+            for ident, endpoint in busy.items():
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(endpoint or "unknown")
+                with self.lock:
+                    self.samples[";".join(reversed(stack))] += 1
+
+    # --- cProfile mode ---
+    def should_profile(self):
+        with self.lock:
+            if not self.running or self.mode != "cprofile":
+                return False
+            self.request_count += 1
+            return self.request_count % self.every == 0
+
+    def add_profile(self, profile):
+        with self.lock:
+            self.profiled_requests += 1
+            if self.stats is None:
+                self.stats = pstats.Stats(profile)
+            else:
+                self.stats.add(profile)
+
+    def summary(self):
+        return {
+            "mode": self.mode,
+            "running": self.running,
+            "seconds": self.seconds,
+            "elapsed": round((self.stopped or time.time()) - self.started, 3),
+            "samples": sum(self.samples.values()),
+            "profiled_requests": self.profiled_requests,
+        }
+
+    def collapsed(self):
+        with self.lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def pstats_text(self, limit):
+        with self.lock:
+            if self.stats is None:
+                return ""
+            out = io.StringIO()
+            self.stats.stream = out
+            self.stats.sort_stats("cumulative").print_stats(limit)
+            return out.getvalue()
+
+
+session = None
+
+
+def log_slow_request(entry):
+    slow_requests.append(entry)
+    print(f"[Slow] {entry['method']} {entry['path']} took {entry['duration_ms']} ms "
+          f"(lock wait {entry['io']['lock_wait_ms']} ms)")
+    try:
+        os.makedirs(os.path.dirname(SLOW_LOG_FILE), exist_ok=True)
+        with open(SLOW_LOG_FILE, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+    except OSError as e:
+        print(f"[!] Could not write slow request log: {e}")
+
+
+def init_profiling(app):
+    """Time every request, feed the slow-request log and attach the active profiler."""
+
+    @app.before_request
+    def start_request_timer():
+        reset_io_stats()
+        request.environ["taskmanager.started"] = time.perf_counter()
+        with active_lock:
+            active_requests[threading.get_ident()] = request.endpoint
+
+        current = session
+        if current is not None and current.should_profile():
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                return None  # another profiler is already active on this interpreter
+            request.environ["taskmanager.profile"] = (current, profile)
+        return None
+
+    @app.teardown_request
+    def finish_request_timer(exc):
+        with active_lock:
+            active_requests.pop(threading.get_ident(), None)
+
+        profiled = request.environ.pop("taskmanager.profile", None)
+        if profiled is not None:
+            current, profile = profiled
+            profile.disable()
+            current.add_profile(profile)
+
+        started = request.environ.get("taskmanager.started")
+        if started is None:
+            return
+        duration_ms = (time.perf_counter() - started) * 1000
+        # Long-polls are slow on purpose
+        if duration_ms >= SLOW_REQUEST_MS and not request.environ.get("taskmanager.long_poll"):
+            log_slow_request({
+                "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "method": request.method,
+                "path": request.path,
+                "endpoint": request.endpoint,
+                "duration_ms": round(duration_ms, 3),
+                "io": get_io_stats(),
+                "error": repr(exc) if exc else None,
+            })
+
+
+@admin_bp.before_request
+def local_only():
+    # Profiling exposes code internals; only allow it from the server's own machine
+    if request.remote_addr not in ("127.0.0.1", "::1"):
+        return jsonify({"error": "Admin endpoints are only available locally"}), 403
+    return None
+
+
+@admin_bp.route("/profile/start", methods=["POST"])
+def start_profile():
+    global session
+    data = request.get_json(silent=True) or {}
+    mode = data.get("mode", "sample")
+    seconds = data.get("seconds", 30)
+    every = data.get("every", 1)
+    interval_ms = data.get("interval_ms", 5)
+
+    if mode not in ("sample", "cprofile"):
+        return jsonify({"error": "mode must be 'sample' or 'cprofile'"}), 400
+    if not isinstance(seconds, (int, float)) or not 0 < seconds <= MAX_PROFILE_SECONDS:
+        return jsonify({"error": f"seconds must be between 0 and {MAX_PROFILE_SECONDS}"}), 400
+    if not isinstance(every, int) or isinstance(every, bool) or every < 1:
+        return jsonify({"error": "every must be a whole number of at least 1"}), 400
+    if not isinstance(interval_ms, (int, float)) or isinstance(interval_ms, bool) or not 0 < interval_ms <= MAX_PROFILE_SECONDS * 1000:
+        return jsonify({"error": f"interval_ms must be between 0 and {MAX_PROFILE_SECONDS * 1000}"}), 400
+    if session is not None and session.running:
+        return jsonify({"error": "A profiling session is already running"}), 409
+
+    session = ProfileSession(mode, seconds, every, interval_ms)
+    session.start()
+    return jsonify(session.summary()), 200
+
+
+@admin_bp.route("/profile/stop", methods=["POST"])
+def stop_profile():
+    if session is None:
+        return jsonify({"error": "No profiling session"}), 404
+
+    session.stop()
+    return jsonify(session.summary()), 200
+
+
+@admin_bp.route("/profile/result", methods=["GET"])
+def profile_result():
+    if session is None:
+        return jsonify({"error": "No profiling session"}), 404
+
+    output = request.args.get("format")
+    if output == "collapsed":
+        return Response(session.collapsed(), mimetype="text/plain")
+    if output == "pstats":
+        return Response(session.pstats_text(request.args.get("limit", 50, type=int)), mimetype="text/plain")
+    return jsonify(session.summary()), 200
+
+
+@admin_bp.route("/slow", methods=["GET"])
+def list_slow_requests():
+    return jsonify(list(slow_requests)), 200
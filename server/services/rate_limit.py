@@ -0,0 +1,164 @@
+import math
+import time
+from threading import Lock
+
+from flask import request, jsonify
+
+# Cap on all requests from one address, whichever user ids they claim
+ADDRESS_LIMIT = (50.0, 100)
+ADDRESS_ROUTE = "*"
+
+# Per-route token bucket limits: endpoint -> (tokens per second, burst size)
+DEFAULT_LIMIT = (10.0, 20)
+ROUTE_LIMITS = {
+    "chat.send_message": (2.0, 5),
+    "chat.get_chat": (2.0, 6),
+    "task.create_task": (1.0, 5),
+    "user.register_user": (0.5, 3),
+    ADDRESS_ROUTE: ADDRESS_LIMIT,
+}
+
+# Max requests a single server works on at once before shedding load
+MAX_CONCURRENT_REQUESTS = 16
+OVERLOAD_RETRY_AFTER = 1  # seconds
+
+# Idle buckets are dropped after this long so the table does not grow forever
+BUCKET_IDLE_TTL = 300
+
+
+class TokenBucket:
+    """Classic token bucket: refills at `rate` tokens/s up to `burst` tokens."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self, now):
+        """Take one token. Returns 0 on success, otherwise seconds until one is available."""
+        # `now` may predate a bucket created after it was read
+        self.tokens = min(self.burst, self.tokens + max(0.0, now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Keeps one token bucket per (client, route) pair."""
+
+    def __init__(self, route_limits, default_limit):
+        self.route_limits = route_limits
+        self.default_limit = default_limit
+        self.buckets = {}
+        self.lock = Lock()
+        self.last_sweep = time.monotonic()
+
+    def check(self, client_key, route):
+        """Return 0 if the request may proceed, otherwise the Retry-After delay in seconds."""
+        now = time.monotonic()
+        with self.lock:
+            if now - self.last_sweep > BUCKET_IDLE_TTL:
+                self._sweep(now)
+            bucket = self.buckets.get((client_key, route))
+            if bucket is None:
+                rate, burst = self.route_limits.get(route, self.default_limit)
+                bucket = self.buckets[(client_key, route)] = TokenBucket(rate, burst)
+            return bucket.take(now)
+
+    def _sweep(self, now):
+        self.buckets = {
+            key: bucket for key, bucket in self.buckets.items()
+            if now - bucket.updated < BUCKET_IDLE_TTL
+        }
+        self.last_sweep = now
+
+
+class ConcurrencyGate:
+    """Bounded budget of in-flight requests; rejects instead of queueing when full."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self.lock = Lock()
+
+    def try_enter(self):
+        with self.lock:
+            if self.active >= self.limit:
+                return False
+            self.active += 1
+            return True
+
+    def leave(self):
+        with self.lock:
+            self.active -= 1
+
+
+limiter = RateLimiter(ROUTE_LIMITS, DEFAULT_LIMIT)
+gate = ConcurrencyGate(MAX_CONCURRENT_REQUESTS)
+
+
+def client_key():
+    """Identify the caller by address and, when the request carries one, user_id.
+
+    user_id is not authenticated, so it only splits the budget of one address between
+    the users behind it: claiming someone else's id from another address cannot use
+    up their tokens, and rotating ids is bounded by the per-address limit.
+    """
+    data = request.get_json(silent=True) if request.is_json else None
+    data = data if isinstance(data, dict) else {}
+    user_id = (
+        request.args.get("user_id")
+        or data.get("user_id")
+        or data.get("actor_id")
+        or data.get("owner_id")
+    )
+    address = f"addr:{request.remote_addr}"
+    return f"{address}/user:{user_id}" if user_id else address
+
+
+def too_many_requests(error, retry_after, status):
+    response = jsonify({"error": error, "retry_after": retry_after})
+    response.status_code = status
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+def release_admission():
+    """Give back this request's concurrency slot early, before a long-poll wait."""
+    request.environ["taskmanager.long_poll"] = True
+    release_slot()
+
+
+def release_slot():
+    if request.environ.pop("taskmanager.admitted", False):
+        gate.leave()
+
+
+def init_admission_control(app):
+    """Install per-user/per-route rate limiting and the concurrency budget on a Flask app."""
+
+    @app.before_request
+    def admit_request():
+        if request.endpoint in (None, "health_check", "static"):
+            return None
+
+        wait = (
+            limiter.check(f"addr:{request.remote_addr}", ADDRESS_ROUTE)
+            or limiter.check(client_key(), request.endpoint)
+        )
+        if wait:
+            return too_many_requests("Rate limit exceeded", max(1, math.ceil(wait)), 429)
+
+        if not gate.try_enter():
+            return too_many_requests("Server overloaded", OVERLOAD_RETRY_AFTER, 503)
+        request.environ["taskmanager.admitted"] = True
+        return None
+
+    @app.teardown_request
+    def release_request(exc):
+        release_slot()
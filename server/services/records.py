@@ -0,0 +1,191 @@
+import datetime
+import sys
+from array import array
+from threading import Lock
+from server.services.utils import data_path, register_snapshot_decoder
+
+# Compact in-memory representation of tasks.
+#
+# The task DB snapshot shared by readers holds TaskRecord objects instead of
+# plain dicts: user ids and names are interned into small integer references,
+# members are an insertion-ordered set (dict keys) for O(1) membership checks,
+# and each chat is stored column by column (user refs, name refs, epoch seconds,
+# message text). to_dict() gives back the JSON shape the API has always used.
+# Writers still read and save plain dicts through load_json_safe/save_json_safe.
+
+TASK_DB = data_path("db", "tasks.json")
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+EPOCH = datetime.datetime(1970, 1, 1)
+NO_TIME = -1
+
+
+class StringTable:
+    """Interns strings into small integer references (and back)."""
+
+    def __init__(self):
+        self.values = []
+        self.refs = {}
+        self.lock = Lock()
+
+    def ref(self, value):
+        if not isinstance(value, str):
+            value = "" if value is None else str(value)  # tolerate hand-edited or legacy ids
+        ref = self.refs.get(value)
+        if ref is None:
+            with self.lock:
+                ref = self.refs.get(value)
+                if ref is None:
+                    ref = len(self.values)
+                    self.values.append(sys.intern(value))
+                    self.refs[self.values[ref]] = ref
+        return ref
+
+    def lookup(self, value):
+        """Reference of an already interned string, or None (never adds)."""
+        return self.refs.get(value) if isinstance(value, str) else None
+
+    def value(self, ref):
+        return self.values[ref]
+
+
+def text(value, default):
+    """Strings stay as they are; hand-edited values of other types are stored as text."""
+    if isinstance(value, str):
+        return value
+    return default if value is None else str(value)
+
+
+user_ids = StringTable()
+usernames = StringTable()
+
+
+def encode_time(timestamp):
+    # Only exactly "YYYY-MM-DD HH:MM:SS" is encoded; anything else is kept verbatim
+    if not (isinstance(timestamp, str) and len(timestamp) == 19 and timestamp[10] == " "
+            and timestamp[4] == timestamp[7] == "-" and timestamp[13] == timestamp[16] == ":"):
+        return NO_TIME
+    try:
+        parsed = datetime.datetime.fromisoformat(timestamp)
+    except ValueError:
+        return NO_TIME
+    return int((parsed - EPOCH).total_seconds())
+
+
+def decode_time(seconds):
+    return (EPOCH + datetime.timedelta(seconds=seconds)).strftime(TIMESTAMP_FORMAT)
+
+
+class ChatLog:
+    """Columnar chat messages of one task."""
+
+    __slots__ = ("user_refs", "name_refs", "times", "messages", "raw_times")
+
+    def __init__(self):
+        self.user_refs = array("I")
+        self.name_refs = array("I")
+        self.times = array("q")
+        self.messages = []
+        self.raw_times = None  # index -> timestamp string that is not in TIMESTAMP_FORMAT
+
+    def __len__(self):
+        return len(self.messages)
+
+    def append(self, msg):
+        timestamp = msg.get("timestamp", "")
+        seconds = encode_time(timestamp)
+        if seconds == NO_TIME and timestamp:
+            if self.raw_times is None:
+                self.raw_times = {}
+            self.raw_times[len(self.messages)] = timestamp
+        self.user_refs.append(user_ids.ref(msg.get("user_id")))
+        self.name_refs.append(usernames.ref(msg.get("username") or "Unknown"))
+        self.times.append(seconds)
+        self.messages.append(msg.get("message", ""))
+
+    def message(self, index):
+        seconds = self.times[index]
+        if seconds != NO_TIME:
+            timestamp = decode_time(seconds)
+        else:
+            timestamp = self.raw_times.get(index, "") if self.raw_times else ""
+        return {
+            "user_id": user_ids.value(self.user_refs[index]),
+            "username": usernames.value(self.name_refs[index]),
+            "message": self.messages[index],
+            "timestamp": timestamp,
+        }
+
+    def to_list(self, start=0):
+        return [self.message(i) for i in range(max(0, start), len(self.messages))]
+
+
+class TaskRecord:
+    __slots__ = ("title", "owner_ref", "status", "members", "chat")
+
+    def __init__(self, title, owner_id, status):
+        self.title = title
+        self.owner_ref = user_ids.ref(owner_id)
+        self.status = sys.intern(status)
+        self.members = {}  # user ref -> None, an insertion-ordered set
+        self.chat = ChatLog()
+
+    @property
+    def owner_id(self):
+        return user_ids.value(self.owner_ref)
+
+    def has_member(self, user_id):
+        ref = user_ids.lookup(user_id)
+        return ref is not None and ref in self.members
+
+    def member_ids(self):
+        return [user_ids.value(ref) for ref in self.members]
+
+    def to_dict(self):
+        """The task in the JSON shape of the API and of tasks.json."""
+        return {
+            "title": self.title,
+            "owner_id": self.owner_id,
+            "status": self.status,
+            "members": self.member_ids(),
+            "chat": self.chat.to_list(),
+        }
+
+    @classmethod
+    def from_dict(cls, task):
+        record = cls(text(task.get("title"), "Untitled"), task.get("owner_id", "unknown"), text(task.get("status"), "Pending"))
+        members = task.get("members")
+        for user_id in members if isinstance(members, list) else []:
+            record.members[user_ids.ref(user_id)] = None
+        chat = task.get("chat")
+        for msg in chat if isinstance(chat, list) else []:
+            if isinstance(msg, dict):
+                record.chat.append(msg)
+        return record
+
+
+def decode_tasks(tasks, base=None, changed=None):
+    """Task DB document -> {task_id: TaskRecord}. A malformed task is left out, never the whole DB.
+
+    With `base` (the previous snapshot's records) only the `changed` task ids are rebuilt;
+    records are immutable once published, so the others are shared with `base`.
+    """
+    if base is None:
+        records, task_ids = {}, tasks
+    else:
+        records, task_ids = dict(base), changed
+    for task_id in task_ids:
+        task = tasks.get(task_id)
+        record = None
+        if isinstance(task, dict):
+            try:
+                record = TaskRecord.from_dict(task)
+            except Exception as e:
+                print(f"[Warning] Skipping malformed task {task_id}: {e}")
+        if record is None:
+            records.pop(task_id, None)  # deleted or malformed
+        else:
+            records[task_id] = record  # an existing task keeps its position in the DB order
+    return records
+
+
+register_snapshot_decoder(TASK_DB, decode_tasks)
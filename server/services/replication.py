@@ -0,0 +1,277 @@
+from flask import Blueprint, request, jsonify
+from collections import deque
+import os
+import threading
+import time
+import uuid
+import requests
+from server.services import events
+from server.services.utils import DATA_DIR, add_save_hook, load_json_safe, save_json_safe, data_path
+
+# Primary/replica replication of the JSON database.
+#
+# The primary records every save of a JSON file as a mutation: the top-level keys
+# that were set or deleted in that file. Replicas poll the primary for mutations after
+# the last sequence number they applied and write them to their own local copy,
+# so they can serve reads without sharing the primary's files.
+
+replication_bp = Blueprint("replication", __name__)
+
+LOG_LIMIT = 10000  # mutations kept in memory for replicas to catch up from
+POLL_INTERVAL = 0.5  # seconds between replica polls
+POLL_TIMEOUT = 5
+
+# Endpoints that change data. Replicas refuse these; the middleware sends writes to the primary.
+WRITE_ENDPOINTS = {
+    "user.register_user",
+    "task.create_task",
+    "task.update_status",
+    "task.assign_user",
+    "task.remove_user",
+    "chat.send_message",
+}
+
+# The change feed is appended by the primary's handlers; replicas send clients there
+PRIMARY_ENDPOINTS = WRITE_ENDPOINTS | {"changes.get_changes"}
+
+state = {
+    "role": "standalone",  # "standalone" (shared files), "primary" or "replica"
+    "primary_url": None,
+}
+
+
+class MutationLog:
+    """Ordered log of mutations made on the primary."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.epoch = uuid.uuid4().hex  # changes on restart so replicas know to resync
+        self.seq = 0
+        self.entries = deque(maxlen=LOG_LIMIT)
+        # file -> {key: value} as of the latest mutation. Saved documents are never
+        # modified afterwards, so the values are shared with them instead of copied.
+        self.docs = {}
+
+    def track(self, filepath):
+        """Start tracking a file so it is included in snapshots."""
+        name = self.file_name(filepath)
+        with self.lock:
+            if name not in self.docs:
+                data = load_json_safe(filepath)
+                self.docs[name] = dict(data) if isinstance(data, dict) else {}
+
+    def record(self, filepath, data, changed=None):
+        """Save hook: log the keys that differ from the previous save of the file.
+
+        Only the `changed` keys are compared; the whole document when it is None.
+        """
+        name = self.file_name(filepath)
+        if not isinstance(data, dict):
+            data = {}
+        with self.lock:
+            doc = self.docs.setdefault(name, {})
+            keys = changed if changed is not None else list(data) + [k for k in doc if k not in data]
+            updated = {}
+            deleted = []
+            for key in keys:
+                if key in data:
+                    if key not in doc or doc[key] != data[key]:
+                        updated[key] = doc[key] = data[key]
+                elif key in doc:
+                    del doc[key]
+                    deleted.append(key)
+            if not updated and not deleted:
+                return
+            self.seq += 1
+            self.entries.append({
+                "seq": self.seq,
+                "time": time.time(),
+                "file": name,
+                "set": updated,
+                "delete": deleted,
+            })
+
+    def since(self, seq):
+        """Entries after `seq`, or None if they have already been dropped from the log."""
+        with self.lock:
+            first = self.entries[0]["seq"] if self.entries else self.seq + 1
+            if seq < first - 1 or seq > self.seq:
+                return None
+            return [e for e in self.entries if e["seq"] > seq]
+
+    def snapshot(self):
+        with self.lock:
+            files = {name: dict(doc) for name, doc in self.docs.items()}
+            return {"epoch": self.epoch, "seq": self.seq, "files": files}
+
+    @staticmethod
+    def file_name(filepath):
+        # Stored relative to DATA_DIR so each replica maps it into its own folder
+        return os.path.relpath(filepath, DATA_DIR or ".").replace(os.sep, "/")
+
+
+mutation_log = MutationLog()
+
+
+class Replica:
+    """Background follower that pulls mutations from the primary and applies them locally."""
+
+    def __init__(self, primary_url):
+        self.primary_url = primary_url
+        self.epoch = None
+        self.applied_seq = 0
+        self.primary_seq = 0
+        self.last_applied_time = None  # primary timestamp of the newest applied mutation
+        self.last_sync = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"[!] Replication error: {e}")
+                time.sleep(POLL_INTERVAL * 4)
+            time.sleep(POLL_INTERVAL)
+
+    def poll(self):
+        if self.epoch is None:
+            self.resync()
+            return
+
+        response = requests.get(
+            f"{self.primary_url}/replication/log",
+            params={"since": self.applied_seq, "epoch": self.epoch},
+            timeout=POLL_TIMEOUT
+        )
+        response.raise_for_status()
+        data = response.json()
+        if data.get("resync"):
+            self.resync()
+            return
+
+        self.apply(data["entries"])
+        with self.lock:
+            self.primary_seq = data["seq"]
+            self.last_sync = time.time()
+
+    def resync(self):
+        """Replace the local copy with a full snapshot from the primary."""
+        response = requests.get(f"{self.primary_url}/replication/snapshot", timeout=POLL_TIMEOUT)
+        response.raise_for_status()
+        snapshot = response.json()
+        for name, doc in snapshot["files"].items():
+            save_json_safe(self.local_path(name), doc)
+        with self.lock:
+            self.epoch = snapshot["epoch"]
+            self.applied_seq = self.primary_seq = snapshot["seq"]
+            self.last_applied_time = self.last_sync = time.time()
+        # The files were replaced wholesale, so changes may have come without events:
+        # drop the search index, statistics and other caches built from the old copy
+        events.deliver("reset", {})
+        print(f"[✓] Replica resynced from primary at seq {self.applied_seq}")
+
+    def apply(self, entries):
+        if not entries:
+            return
+        # Group by file so each file is loaded and saved once per batch
+        docs = {}
+        changed = {}
+        for entry in entries:
+            name = entry["file"]
+            if name not in docs:
+                docs[name] = load_json_safe(self.local_path(name))
+                changed[name] = set()
+            doc = docs[name]
+            doc.update(entry["set"])
+            for key in entry["delete"]:
+                doc.pop(key, None)
+            changed[name].update(entry["set"], entry["delete"])
+        for name, doc in docs.items():
+            save_json_safe(self.local_path(name), doc, changed=changed[name])
+        with self.lock:
+            self.applied_seq = entries[-1]["seq"]
+            self.last_applied_time = entries[-1]["time"]
+
+    @staticmethod
+    def local_path(name):
+        path = data_path(*name.split("/"))
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        return path
+
+    def status(self):
+        with self.lock:
+            now = time.time()
+            lag_seq = self.primary_seq - self.applied_seq
+            lag_seconds = now - self.last_applied_time if lag_seq and self.last_applied_time else 0
+            return {
+                "applied_seq": self.applied_seq,
+                "primary_seq": self.primary_seq,
+                "lag_seq": lag_seq,
+                "lag_seconds": round(lag_seconds, 3),
+                "seconds_since_sync": round(now - self.last_sync, 3) if self.last_sync else None,
+            }
+
+
+replica = None
+
+
+def init_replication(app, role="standalone", primary_url=None, files=()):
+    """Configure this server as a replication primary, replica, or standalone server."""
+    global replica
+    state["role"] = role
+    state["primary_url"] = primary_url
+
+    if role == "primary":
+        for filepath in files:
+            mutation_log.track(filepath)
+        add_save_hook(mutation_log.record)
+
+    elif role == "replica":
+        replica = Replica(primary_url)
+        replica.start()
+
+        @app.before_request
+        def reject_writes():
+            if request.endpoint in PRIMARY_ENDPOINTS:
+                return jsonify({
+                    "error": "This server is a read-only replica; send writes and /changes to the primary",
+                    "primary": primary_url
+                }), 421
+            return None
+
+
+@replication_bp.route("/log", methods=["GET"])
+def get_log():
+    if state["role"] != "primary":
+        return jsonify({"error": "Not a replication primary"}), 400
+
+    since = request.args.get("since", 0, type=int)
+    epoch = request.args.get("epoch")
+    entries = mutation_log.since(since) if epoch == mutation_log.epoch else None
+    if entries is None:
+        return jsonify({"resync": True}), 200
+
+    return jsonify({"epoch": mutation_log.epoch, "seq": mutation_log.seq, "entries": entries}), 200
+
+
+@replication_bp.route("/snapshot", methods=["GET"])
+def get_snapshot():
+    if state["role"] != "primary":
+        return jsonify({"error": "Not a replication primary"}), 400
+
+    return jsonify(mutation_log.snapshot()), 200
+
+
+@replication_bp.route("/status", methods=["GET"])
+def get_status():
+    status = {"role": state["role"]}
+    if state["role"] == "primary":
+        status["seq"] = mutation_log.seq
+    elif replica is not None:
+        status["primary"] = state["primary_url"]
+        status.update(replica.status())
+    return jsonify(status), 200
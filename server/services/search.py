@@ -0,0 +1,172 @@
+import heapq
+import math
+import re
+import threading
+from server.services.utils import read_snapshot
+from server.services.records import TASK_DB
+from server.services import events
+
+# In-memory inverted index over task titles and chat messages.
+#
+# Built from the task DB on first use, then kept up to date incrementally from
+# "task.*" and "chat.*" events, which create_task / send_message publish locally and
+# other servers relay through the middleware. Postings are kept per task and a query
+# only visits the tasks of the searching user, so its cost depends on how many tasks
+# that user belongs to and how many of their documents match, not on the size of
+# the whole database. Global document frequencies are kept for the idf weights.
+# Events relayed from other servers can arrive late or out of order, so the index
+# is rebuilt from the DB snapshot once it has been saved REBUILD_EVERY times since
+# the last build (less often than the statistics: re-tokenizing every chat costs more).
+
+TOKEN_RE = re.compile(r"\w+")
+MAX_QUERY_TOKENS = 10
+REBUILD_EVERY = 5000
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or "").lower())
+
+
+class SearchIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.loaded = False
+        self.built_version = 0  # snapshot version the index was last built from
+        self.postings = {}    # task_id -> {token: {doc_id: term frequency}}
+        self.doc_freq = {}    # token -> number of docs containing it
+        self.docs = {}        # doc_id -> {"task_id", "type", "text", "tokens", ...}
+        self.members = {}     # task_id -> set of user ids allowed to see its docs
+        self.user_tasks = {}  # user_id -> set of task ids they may search
+        self.titles = {}      # task_id -> title, for showing message hits
+
+    def ensure_loaded(self):
+        # Events wait on the lock while the index is built, so none are lost in between
+        with self.lock:
+            snapshot = read_snapshot(TASK_DB)
+            if self.loaded and snapshot.version - self.built_version < REBUILD_EVERY:
+                return
+            self.clear()
+            for task_id, task in snapshot.data.items():
+                self.add_task(task_id, task.title, task.member_ids())
+                for index, msg in enumerate(task.chat.to_list()):
+                    self.add_message(task_id, index, msg)
+            self.loaded = True
+            self.built_version = snapshot.version
+
+    def reset(self):
+        with self.lock:
+            self.clear()
+
+    # --- incremental updates (caller holds self.lock) ---
+    def add_doc(self, doc_id, text, task_id, **info):
+        tokens = tokenize(text)
+        self.docs[doc_id] = {"text": text, "tokens": tokens, "task_id": task_id, **info}
+        task_postings = self.postings.setdefault(task_id, {})
+        for token in tokens:
+            posting = task_postings.setdefault(token, {})
+            if doc_id not in posting:
+                self.doc_freq[token] = self.doc_freq.get(token, 0) + 1
+            posting[doc_id] = posting.get(doc_id, 0) + 1
+
+    def remove_doc(self, doc_id):
+        doc = self.docs.pop(doc_id, None)
+        if doc is None:
+            return
+        task_postings = self.postings.get(doc["task_id"], {})
+        for token in set(doc["tokens"]):
+            posting = task_postings.get(token)
+            if posting is not None and posting.pop(doc_id, None) is not None:
+                if not posting:
+                    del task_postings[token]
+                self.doc_freq[token] -= 1
+                if not self.doc_freq[token]:
+                    del self.doc_freq[token]
+
+    def add_task(self, task_id, title, members):
+        old_members = self.members.get(task_id, set())
+        new_members = set(members)
+        for user_id in old_members - new_members:
+            self.user_tasks[user_id].discard(task_id)
+            if not self.user_tasks[user_id]:
+                del self.user_tasks[user_id]
+        for user_id in new_members - old_members:
+            self.user_tasks.setdefault(user_id, set()).add(task_id)
+        self.members[task_id] = new_members
+        if self.titles.get(task_id) != title:
+            self.remove_doc(task_id)
+            self.add_doc(task_id, title, task_id=task_id, type="task")
+            self.titles[task_id] = title
+
+    def add_message(self, task_id, index, msg):
+        doc_id = f"{task_id}#{index}"
+        if doc_id in self.docs:
+            return  # already indexed (e.g. the event raced the initial build)
+        self.add_doc(
+            doc_id, msg.get("message", ""),
+            task_id=task_id, type="message", index=index,
+            user_id=msg.get("user_id"), username=msg.get("username"), timestamp=msg.get("timestamp")
+        )
+
+    def on_event(self, topic, data):
+        if topic == "reset":
+            self.reset()
+            return
+        with self.lock:
+            if not self.loaded:
+                return  # the next build reads this change from the DB
+            if topic in ("task.created", "task.changed"):
+                self.add_task(data["task_id"], data.get("title") or "", data.get("members", []))
+            elif topic == "chat.sent":
+                self.add_message(data["task_id"], data["index"], data)
+
+    # --- queries ---
+    def search(self, query, user_id, offset=0, limit=20):
+        """Ranked hits visible to user_id, plus the total number of hits."""
+        self.ensure_loaded()
+        tokens = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TOKENS]
+        with self.lock:
+            doc_count = max(1, len(self.docs))
+            idfs = {
+                token: math.log(1 + doc_count / self.doc_freq[token])
+                for token in tokens if token in self.doc_freq
+            }
+            scores = {}
+            for task_id in self.user_tasks.get(user_id, ()):
+                task_postings = self.postings.get(task_id)
+                if not task_postings:
+                    continue
+                for token, idf in idfs.items():
+                    for doc_id, tf in task_postings.get(token, {}).items():
+                        scores[doc_id] = scores.get(doc_id, 0) + (1 + math.log(tf)) * idf
+
+            # Only the top offset+limit hits need ordering
+            top = heapq.nlargest(offset + limit, scores.items(), key=lambda item: item[1])
+            page = top[offset:]
+            hits = []
+            for doc_id, score in page:
+                doc = self.docs[doc_id]
+                hit = {
+                    "type": doc["type"],
+                    "task_id": doc["task_id"],
+                    "title": self.titles.get(doc["task_id"], ""),
+                    "score": round(score, 4),
+                }
+                if doc["type"] == "message":
+                    hit.update({
+                        "index": doc["index"],
+                        "message": doc["text"],
+                        "user_id": doc["user_id"],
+                        "username": doc["username"],
+                        "timestamp": doc["timestamp"],
+                    })
+                hits.append(hit)
+            return hits, len(scores)
+
+
+search_index = SearchIndex()
+events.subscribe("task.", search_index.on_event)
+events.subscribe("chat.", search_index.on_event)
+events.subscribe("reset", search_index.on_event)
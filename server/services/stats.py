@@ -0,0 +1,126 @@
+import threading
+from server.services.utils import read_snapshot
+from server.services.records import TASK_DB
+from server.services import events
+
+# Task statistics kept up to date incrementally.
+#
+# Like the search index, the counters are built from the task DB on first use and
+# then maintained from "task.*" and "chat.*" events (local and from other servers).
+# Each task's last known summary is remembered, so an update subtracts the old
+# contribution and adds the new one instead of rescanning tasks. Events relayed from
+# other servers can still arrive late or out of order, so the counters are rebuilt
+# from the DB snapshot once it has been saved REBUILD_EVERY times since the last build.
+
+REBUILD_EVERY = 1000
+
+
+def bump(counter, key, delta):
+    value = counter.get(key, 0) + delta
+    if value:
+        counter[key] = value
+    else:
+        counter.pop(key, None)
+
+
+class TaskStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.loaded = False
+        self.built_version = 0  # snapshot version the counters were last built from
+        self.summaries = {}   # task_id -> {"status", "owner_id", "members", "chat_count"}
+        self.by_status = {}   # status -> number of tasks
+        self.by_owner = {}    # owner_id -> {status: n}
+        self.by_member = {}   # user_id -> {status: n}
+        self.member_tasks = {}  # user_id -> set of task ids
+        self.messages = 0
+
+    def ensure_loaded(self):
+        with self.lock:
+            snapshot = read_snapshot(TASK_DB)
+            if self.loaded and snapshot.version - self.built_version < REBUILD_EVERY:
+                return
+            self.clear()
+            for task_id, task in snapshot.data.items():
+                self.update_task(task_id, task.status, task.owner_id, task.member_ids(), len(task.chat))
+            self.loaded = True
+            self.built_version = snapshot.version
+
+    def reset(self):
+        with self.lock:
+            self.clear()
+
+    # --- incremental updates (caller holds self.lock) ---
+    def apply(self, summary, sign):
+        status = summary["status"]
+        bump(self.by_status, status, sign)
+        bump(self.by_owner.setdefault(summary["owner_id"], {}), status, sign)
+        for user_id in summary["members"]:
+            bump(self.by_member.setdefault(user_id, {}), status, sign)
+            tasks = self.member_tasks.setdefault(user_id, set())
+            if sign > 0:
+                tasks.add(summary["task_id"])
+            else:
+                tasks.discard(summary["task_id"])
+        self.messages += sign * summary["chat_count"]
+
+    def update_task(self, task_id, status, owner_id, members, chat_count=None):
+        old = self.summaries.get(task_id)
+        if chat_count is None:
+            chat_count = old["chat_count"] if old else 0
+        new = {
+            "task_id": task_id,
+            "status": status,
+            "owner_id": owner_id,
+            "members": set(members),
+            "chat_count": chat_count,
+        }
+        if old is not None:
+            self.apply(old, -1)
+        self.apply(new, 1)
+        self.summaries[task_id] = new
+
+    def on_event(self, topic, data):
+        if topic == "reset":
+            self.reset()
+            return
+        with self.lock:
+            if not self.loaded:
+                return  # the next build reads this change from the DB
+            task_id = data["task_id"]
+            if topic in ("task.created", "task.changed"):
+                self.update_task(task_id, data.get("status") or "Pending", data.get("owner_id"), data.get("members", []))
+            elif topic == "chat.sent" and task_id in self.summaries:
+                summary = self.summaries[task_id]
+                count = max(summary["chat_count"], data["index"] + 1)
+                self.messages += count - summary["chat_count"]
+                summary["chat_count"] = count
+
+    # --- queries ---
+    def system_stats(self):
+        self.ensure_loaded()
+        with self.lock:
+            return {
+                "tasks": len(self.summaries),
+                "by_status": dict(self.by_status),
+                "messages": self.messages,
+            }
+
+    def user_stats(self, user_id):
+        self.ensure_loaded()
+        with self.lock:
+            task_ids = self.member_tasks.get(user_id, set())
+            return {
+                "owned": dict(self.by_owner.get(user_id, {})),
+                "member": dict(self.by_member.get(user_id, {})),
+                "chat_counts": {tid: self.summaries[tid]["chat_count"] for tid in task_ids},
+            }
+
+
+task_stats = TaskStats()
+events.subscribe("task.", task_stats.on_event)
+events.subscribe("chat.", task_stats.on_event)
+events.subscribe("reset", task_stats.on_event)
@@ -1,13 +1,17 @@
 from flask import Blueprint, request, jsonify
+from bisect import bisect_right
 import os
-from server.services.utils import generate_id, load_json_safe, save_json_safe
+from server.services.utils import generate_unique_id, load_json_safe, load_json_snapshot, save_json_safe, update_json
+from server.services import events
+from server.services.changes import record_task_change
+from server.services.records import TASK_DB
+from server.services.search import search_index
+from server.services.stats import task_stats
 
 task_bp = Blueprint("task", __name__)
-TASK_DB = os.path.join("db", "tasks.json")
 
 # Ensure DB file exists
-if not os.path.exists("db"):
-    os.makedirs("db")
+os.makedirs(os.path.dirname(TASK_DB), exist_ok=True)
 if not os.path.exists(TASK_DB):
     save_json_safe(TASK_DB, {})
 
@@ -51,6 +55,17 @@ def clean_tasks():
 clean_tasks()
 # --------------------------------------------------
 
+def publish_task(topic, task_id, task):
+    """Notify other servers that a task was created or changed."""
+    events.publish(
+        topic,
+        task_id=task_id,
+        title=task.get("title"),
+        owner_id=task.get("owner_id"),
+        status=task.get("status"),
+        members=task.get("members", [])
+    )
+
 @task_bp.route("/create", methods=["POST"])
 def create_task():
     data = request.json
@@ -60,29 +75,43 @@ def create_task():
     if not title or not owner_id:
         return jsonify({"error": "Missing title or owner_id"}), 400
 
-    tasks = load_json_safe(TASK_DB)
-    task_id = generate_id()
-
-    tasks[task_id] = {
-        "title": title,
-        "owner_id": owner_id,  # Ensure this is "owner_id"
-        "status": "Pending",
-        "members": [owner_id],
-        "chat": []
-    }
-    
-    save_json_safe(TASK_DB, tasks)
+    if not isinstance(owner_id, str):
+        return jsonify({"error": "owner_id must be a string"}), 400
+
+    with update_json(TASK_DB) as tx:
+        task_id = generate_unique_id(tx.data, prefix="task")
+        task = tx.data[task_id] = {
+            "title": title,
+            "owner_id": owner_id,  # Ensure this is "owner_id"
+            "status": "Pending",
+            "members": [owner_id],
+            "chat": []
+        }
+        tx.save(changed=[task_id])
+        record_task_change(task_id, task)
+        publish_task("task.created", task_id, task)
     return jsonify({"task_id": task_id}), 200
 
 @task_bp.route("/get/<task_id>", methods=["GET"])
 def get_task(task_id):
-    tasks = load_json_safe(TASK_DB)
+    tasks = load_json_snapshot(TASK_DB)
     task = tasks.get(task_id)
 
     if not task:
         return jsonify({"error": "Task not found"}), 404
 
-    return jsonify(task), 200
+    return jsonify(task.to_dict()), 200
+
+# Sorted ids of the latest tasks snapshot, rebuilt only after the snapshot changes
+sorted_index = (None, [])
+
+def sorted_task_ids(tasks):
+    global sorted_index
+    indexed, ids = sorted_index
+    if indexed is not tasks:
+        ids = sorted(tasks)
+        sorted_index = (tasks, ids)
+    return ids
 
 @task_bp.route("/list", methods=["GET"])
 def list_user_tasks():
@@ -90,21 +119,59 @@ def list_user_tasks():
     if not user_id:
         return jsonify({"error": "Missing user_id"}), 400
 
-    tasks = load_json_safe(TASK_DB)
+    # Optional cursor paging: IDs sort by creation time, so "after" is a range-scan key
+    after = request.args.get("after", "")
+    limit = request.args.get("limit", type=int)
+
+    tasks = load_json_snapshot(TASK_DB)
     user_tasks = []
 
-    for tid, task in tasks.items():
-        if user_id in task.get("members", []):
+    if after or limit is not None:
+        ids = sorted_task_ids(tasks)
+        task_ids = (ids[i] for i in range(bisect_right(ids, after), len(ids)))
+    else:
+        task_ids = tasks  # no paging: a plain scan, no ordering needed
+
+    for tid in task_ids:
+        if limit is not None and len(user_tasks) >= limit:
+            break
+        task = tasks[tid]
+        if task.has_member(user_id):
             user_tasks.append({
                 "id": tid,
-                "title": task.get("title", "Untitled"),
-                "status": task.get("status", "Pending"),
-                "owner_id": task.get("owner_id")  # Use .get() to avoid KeyError
+                "title": task.title,
+                "status": task.status,
+                "owner_id": task.owner_id
             })
 
     return jsonify(user_tasks), 200
 
 
+@task_bp.route("/search", methods=["GET"])
+def search_tasks():
+    user_id = request.args.get("user_id")
+    query = request.args.get("q", "").strip()
+    offset = max(0, request.args.get("offset", 0, type=int))
+    limit = min(max(1, request.args.get("limit", 20, type=int)), 100)
+
+    if not user_id or not query:
+        return jsonify({"error": "Missing user_id or q"}), 400
+
+    # Only tasks the user is a member of (and their chats) are searched
+    hits, total = search_index.search(query, user_id, offset, limit)
+    return jsonify({"hits": hits, "total": total, "offset": offset, "limit": limit}), 200
+
+
+@task_bp.route("/stats", methods=["GET"])
+def get_stats():
+    # Served from incrementally maintained counters, no task scan
+    user_id = request.args.get("user_id")
+    stats = {"system": task_stats.system_stats()}
+    if user_id:
+        stats["user"] = task_stats.user_stats(user_id)
+    return jsonify(stats), 200
+
+
 @task_bp.route("/status", methods=["POST"])
 def update_status():
     data = request.json
@@ -114,13 +181,15 @@ def update_status():
     if status not in ["Pending", "In Progress", "Done"]:
         return jsonify({"error": "Invalid status"}), 400
 
-    tasks = load_json_safe(TASK_DB)
-    if task_id in tasks:
-        tasks[task_id]["status"] = status
-        save_json_safe(TASK_DB, tasks)
-        return jsonify({"message": "Status updated"}), 200
-
-    return jsonify({"error": "Task not found"}), 404
+    with update_json(TASK_DB) as tx:
+        task = tx.data.get(task_id)
+        if task is None:
+            return jsonify({"error": "Task not found"}), 404
+        task["status"] = status
+        tx.save(changed=[task_id])
+        record_task_change(task_id, task)
+        publish_task("task.changed", task_id, task)
+    return jsonify({"message": "Status updated"}), 200
 
 @task_bp.route("/assign", methods=["POST"])
 def assign_user():
@@ -129,18 +198,29 @@ def assign_user():
     user_id = data.get("user_id")
     actor_id = data.get("actor_id")  # must be the owner
 
-    tasks = load_json_safe(TASK_DB)
-    task = tasks.get(task_id)
+    if not user_id or not isinstance(user_id, str):
+        return jsonify({"error": "Missing or invalid user_id"}), 400
 
-    if not task:
+    # Checks run on the shared snapshot record (set lookup); only a real change takes the write lock
+    record = load_json_snapshot(TASK_DB).get(task_id)
+
+    if not record:
         return jsonify({"error": "Task not found"}), 404
 
-    if task["owner_id"] != actor_id:
+    if record.owner_id != actor_id:
         return jsonify({"error": "Only the task owner can assign members"}), 403
 
-    if user_id not in task["members"]:
+    if record.has_member(user_id):
+        return jsonify({"message": "User assigned"}), 200
+
+    with update_json(TASK_DB) as tx:
+        task = tx.data.get(task_id)
+        if not task or user_id in task["members"]:
+            return jsonify({"message": "User assigned"}), 200  # assigned by a concurrent request
         task["members"].append(user_id)
-        save_json_safe(TASK_DB, tasks)
+        tx.save(changed=[task_id])
+        record_task_change(task_id, task, added=user_id)
+        publish_task("task.changed", task_id, task)
 
     return jsonify({"message": "User assigned"}), 200
 
@@ -151,17 +231,24 @@ def remove_user():
     user_id = data.get("user_id")
     actor_id = data.get("actor_id")  # must be the owner
 
-    tasks = load_json_safe(TASK_DB)
-    task = tasks.get(task_id)
+    record = load_json_snapshot(TASK_DB).get(task_id)
 
-    if not task:
+    if not record:
         return jsonify({"error": "Task not found"}), 404
 
-    if task["owner_id"] != actor_id:
+    if record.owner_id != actor_id:
         return jsonify({"error": "Only the task owner can remove members"}), 403
 
-    if user_id in task["members"]:
+    if not record.has_member(user_id):
+        return jsonify({"message": "User removed"}), 200
+
+    with update_json(TASK_DB) as tx:
+        task = tx.data.get(task_id)
+        if not task or user_id not in task["members"]:
+            return jsonify({"message": "User removed"}), 200  # removed by a concurrent request
         task["members"].remove(user_id)
-        save_json_safe(TASK_DB, tasks)
+        tx.save(changed=[task_id])
+        record_task_change(task_id, task, removed=user_id)
+        publish_task("task.changed", task_id, task)
 
     return jsonify({"message": "User removed"}), 200
@@ -1,17 +1,16 @@
 from flask import Blueprint, request, jsonify
 import os
-from server.services.utils import generate_id, load_json_safe, save_json_safe
+from server.services.utils import generate_unique_id, load_json_snapshot, save_json_safe, update_json, data_path
+from server.services import events
 
 user_bp = Blueprint("user", __name__)
 
-USER_DB = os.path.join("server", "data", "users.json")
+USER_DB = data_path("server", "data", "users.json")
 
 # Ensure the database file exists
-if not os.path.exists("server/data"):
-    os.makedirs("server/data")
+os.makedirs(os.path.dirname(USER_DB), exist_ok=True)
 if not os.path.exists(USER_DB):
-    with open(USER_DB, "w") as f:
-        json.dump({}, f)  # Create an empty users file if it doesn't exist
+    save_json_safe(USER_DB, {})  # Create an empty users file if it doesn't exist
 
 @user_bp.route("/register", methods=["POST"])
 def register_user():
@@ -21,17 +20,16 @@ def register_user():
     if not username:
         return jsonify({"error": "Username is required"}), 400
 
-    # Load existing users from the database
-    users = load_json_safe(USER_DB)
+    with update_json(USER_DB) as tx:
+        # Generate a unique user ID using the utility function
+        user_id = generate_unique_id(tx.data, prefix="user")
 
-    # Generate a unique user ID using the utility function
-    user_id = generate_id()
+        # Add the new user to the users dictionary
+        tx.data[user_id] = {"id": user_id, "name": username}
 
-    # Add the new user to the users dictionary
-    users[user_id] = {"id": user_id, "name": username}
-
-    # Save the updated users dictionary back to the database
-    save_json_safe(USER_DB, users)
+        # Save the updated users dictionary back to the database
+        tx.save(changed=[user_id])
+        events.publish("user.registered", user_id=user_id, name=username)
 
     # Return the user ID and username as a response
     return jsonify({"user_id": user_id, "username": username}), 201
@@ -45,7 +43,7 @@ def login_user():
         return jsonify({"error": "User ID is required"}), 400
 
     # Load users from the database
-    users = load_json_safe(USER_DB)
+    users = load_json_snapshot(USER_DB)
 
     # Check if the user exists
     user = users.get(user_id)
@@ -61,7 +59,7 @@ def validate_user():
     user_id = data.get("user_id")
 
     # Load users from the database
-    users = load_json_safe(USER_DB)
+    users = load_json_snapshot(USER_DB)
 
     # Check if the user ID exists in the database
     if user_id in users:
@@ -72,7 +70,7 @@ def validate_user():
 @user_bp.route("/list", methods=["GET"])
 def list_users():
     # Load all users from the database
-    users = load_json_safe(USER_DB)
+    users = load_json_snapshot(USER_DB)
 
     # Return the list of users
     return jsonify(users), 200
@@ -1,33 +1,435 @@
-import uuid
+import hashlib
 import json
 import os
-from threading import Lock
+import time
+from contextlib import contextmanager
+from threading import Lock, RLock, local
+import fasteners
 
-lock = Lock()
+# Per-thread storage timings of the current request, read by the slow-request log
+io_stats = local()
+
+def reset_io_stats():
+    io_stats.load_ms = io_stats.save_ms = io_stats.lock_wait_ms = 0.0
+    io_stats.loads = io_stats.saves = 0
+
+def io_counters():
+    if not hasattr(io_stats, "loads"):
+        reset_io_stats()
+    return io_stats
+
+def get_io_stats():
+    """Time spent loading and saving JSON files (and waiting for the write locks) on this thread."""
+    counters = io_counters()
+    return {
+        "loads": counters.loads,
+        "load_ms": round(counters.load_ms, 3),
+        "saves": counters.saves,
+        "save_ms": round(counters.save_ms, 3),
+        "lock_wait_ms": round(counters.lock_wait_ms, 3),
+    }
+
+# Root folder for all database files. Servers that keep their own copy of the
+# data (e.g. replicas on the same machine) point this at a different folder.
+DATA_DIR = os.environ.get("TASKMANAGER_DATA_DIR", "")
+
+def data_path(*parts):
+    """Path of a database file inside DATA_DIR."""
+    return os.path.join(DATA_DIR, *parts)
+
+# Callbacks run after every save of a JSON file, while its write lock is held
+save_hooks = []
+
+def add_save_hook(hook):
+    """Register hook(filepath, data, changed) to observe every write (used by replication).
+
+    `changed` are the top-level keys that differ from the previous save, or None if unknown.
+    """
+    save_hooks.append(hook)
+
+# --- ID generation ---
+# IDs look like "<prefix>_<timestamp><node><sequence>" in fixed-width hex:
+#   12 hex digits of milliseconds since the epoch, 3 of server (node) id, 3 of sequence.
+# Because every part is fixed width, sorting IDs as strings sorts them by creation
+# time, so they can be used directly as range-scan / cursor keys.
+NODE_BITS = 12
+SEQUENCE_BITS = 12
+MAX_NODE_ID = (1 << NODE_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+id_lock = Lock()
+node_id = 0
+last_timestamp = 0
+sequence = 0
+
+def set_node_id(value):
+    """Set the id of this server (0 to MAX_NODE_ID). Must differ between servers."""
+    global node_id
+    value = int(value)
+    if not 0 <= value <= MAX_NODE_ID:
+        raise ValueError(f"node id must be between 0 and {MAX_NODE_ID}, got {value}")
+    node_id = value
 
 # Generate a unique ID (e.g., task ID, user ID)
 def generate_id(prefix="id"):
-    """Generate a short, unique ID using uuid."""
-    return f"{prefix}_{str(uuid.uuid4())[:8]}"
+    """Generate a unique, time-ordered ID: timestamp + node id + per-millisecond sequence."""
+    global last_timestamp, sequence
+    with id_lock:
+        now = int(time.time() * 1000)
+        if now < last_timestamp:
+            now = last_timestamp  # clock stepped back: keep IDs monotonic
+        if now == last_timestamp:
+            sequence = (sequence + 1) & MAX_SEQUENCE
+            if sequence == 0:
+                # Sequence exhausted for this millisecond, wait for the next one
+                while now <= last_timestamp:
+                    time.sleep(0.0001)
+                    now = int(time.time() * 1000)
+        else:
+            sequence = 0
+        last_timestamp = now
+        return f"{prefix}_{now:012x}{node_id:03x}{sequence:03x}"
+
+def generate_unique_id(existing, prefix="id"):
+    """Generate an ID that is not already a key of `existing` (collision check on insert)."""
+    new_id = generate_id(prefix)
+    while new_id in existing:
+        print(f"[Warning] ID collision on {new_id}, generating a new one")
+        new_id = generate_id(prefix)
+    return new_id
+
+def id_timestamp(item_id):
+    """Creation time (epoch seconds) encoded in an ID, or None for legacy random IDs."""
+    _, _, body = item_id.rpartition("_")
+    if len(body) != 18:
+        return None
+    try:
+        return int(body[:12], 16) / 1000
+    except ValueError:
+        return None
+
+# --- Storage: atomic writes and read snapshots ---
+# save_json_safe() writes to a temporary file and renames it over the old one, so a
+# reader always sees either the previous or the new document, never a partial one.
+# A SHA-256 of each file is kept next to it (<file>.sha256) to detect corruption.
+# Parsed documents are cached as immutable snapshots keyed by the file's identity
+# on disk; readers share them without taking the write lock, and every save
+# publishes a new snapshot version. Writers also take an inter-process file lock so
+# servers sharing the same files never interleave a file and its checksum. Handlers
+# that read-modify-write a file do so inside update_json(), which keeps both write
+# locks from the load until the save, so concurrent updates are never lost.
+#
+# A file can register a decoder that turns the parsed document into a more compact
+# read-only form. It runs on the first read of a snapshot, never on the write path,
+# and only blocks readers of that snapshot. When a save names the top-level keys it
+# changed, the decoder only rebuilds those keys on top of the previous snapshot's
+# decoded data. The changed keys (and the checksum they apply to) are also written to
+# the checksum file, so other processes sharing the file can do the same.
+
+CHECKSUM_RETRIES = 3
+
+class StorageError(Exception):
+    """A database file is corrupt and there is no good copy of it in memory."""
+
+class Snapshot:
+    __slots__ = ("version", "file_key", "raw", "digest", "source", "pending", "decode_lock")
+
+    def __init__(self, version, file_key, raw, digest, data, pending=None):
+        self.version = version
+        self.file_key = file_key
+        self.raw = raw
+        self.digest = digest
+        self.source = data
+        self.pending = pending  # (decode, base, changed) until the data is first read
+        self.decode_lock = Lock() if pending is not None else None
+
+    @property
+    def data(self):
+        if self.pending is not None:
+            with self.decode_lock:
+                if self.pending is not None:
+                    decode, base, changed = self.pending
+                    self.source = decode(self.source, base, changed)
+                    self.pending = None
+        return self.source
+
+snapshots = {}
+snapshots_lock = Lock()
+snapshot_decoders = {}
+
+# Version of the snapshot each thread last loaded a private copy from, per file: a
+# save can only be decoded incrementally if it modified the document that is still current
+loaded_from = local()
+
+def register_snapshot_decoder(filepath, decode):
+    """Readers of `filepath` get decoded data from load_json_snapshot() instead of plain JSON.
+
+    decode(document, base, changed) is called with base=None for a full decode, or with
+    the previous snapshot's decoded data and the set of top-level keys that differ from
+    it. It must not modify `base`, which older snapshots still share.
+    """
+    with snapshots_lock:
+        snapshot_decoders[filepath] = decode
+        snapshots.pop(filepath, None)  # drop a snapshot cached before the decoder existed
+
+def pending_decode(filepath, current, changed=None, follows=False):
+    """How a new snapshot of `filepath` gets decoded: from `current` when it only changes `changed` keys."""
+    decode = snapshot_decoders.get(filepath)
+    if decode is None:
+        return None
+    if not follows or changed is None or current is None:
+        return (decode, None, None)
+    pending = current.pending
+    if pending is None:
+        return (decode, current.source, set(changed))
+    _, base, base_changed = pending
+    if base is None:
+        return (decode, None, None)
+    # The current snapshot was never read: decode both saves' keys in one go
+    return (decode, base, base_changed | set(changed))
+
+def file_key(filepath):
+    """Changes whenever the file is replaced or rewritten."""
+    st = os.stat(filepath)
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+def checksum_path(filepath):
+    return filepath + ".sha256"
+
+def read_checksum(filepath):
+    """(checksum, change note) from the checksum file; the note lists the keys the last save changed."""
+    try:
+        with open(checksum_path(filepath), "r") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None, None  # files written before checksums existed
+    if not lines:
+        return None, None
+    note = None
+    if len(lines) > 1:
+        try:
+            note = json.loads(lines[1])
+        except ValueError:
+            pass
+    return lines[0].strip(), note if isinstance(note, dict) else None
+
+def publish_snapshot(filepath, key, raw, digest, data, expected=None, changed=None, base_digest=None):
+    """Install a new snapshot unless another one was published since `expected` was read.
+
+    `changed` are the top-level keys that differ from the snapshot with checksum `base_digest`.
+    """
+    with snapshots_lock:
+        current = snapshots.get(filepath)
+        if expected is not None and current is not expected:
+            return None
+        version = current.version + 1 if current is not None else 1
+        follows = current is not None and base_digest is not None and current.digest == base_digest
+        pending = pending_decode(filepath, current, changed, follows)
+        snapshot = snapshots[filepath] = Snapshot(version, key, raw, digest, data, pending)
+        return snapshot
+
+def read_snapshot(filepath):
+    """Current snapshot of a file; the file is only re-read and parsed if it changed on disk."""
+    if not os.path.exists(filepath):
+        save_json_safe(filepath, {})  # Initialize with an empty dictionary
+
+    cached = snapshots.get(filepath)
+    for _ in range(CHECKSUM_RETRIES):
+        key = file_key(filepath)
+        if cached is not None and cached.file_key == key:
+            return cached
+        with open(filepath, "rb") as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        expected, note = read_checksum(filepath)
+        if expected is None or digest == expected:
+            break
+        time.sleep(0.01)  # another process may be between writing the file and its checksum
+    else:
+        print(f"[Warning] Checksum mismatch for {filepath}: edited by hand or corrupt")
+        note = None
+
+    try:
+        data = json.loads(raw) if raw.strip() else {}
+    except json.JSONDecodeError:
+        # Never hand out {} for a broken file: a writer would save it back and wipe the data
+        if cached is not None:
+            print(f"[Warning] {filepath} is not valid JSON, using the last good copy")
+            return cached
+        raise StorageError(f"{filepath} is not valid JSON")
+
+    changed = note.get("changed") if note else None
+    base_digest = note.get("base") if note else None
+    snapshot = publish_snapshot(
+        filepath, key, raw, digest, data, expected=cached,
+        changed=changed if isinstance(changed, list) else None, base_digest=base_digest
+    )
+    return snapshot or Snapshot(0, key, raw, digest, data, pending_decode(filepath, None))
+
+def load_json_snapshot(filepath):
+    """Shared, read-only view of a JSON file. Do not modify the returned data."""
+    started = time.perf_counter()
+    try:
+        return read_snapshot(filepath).data
+    finally:
+        counters = io_counters()
+        counters.loads += 1
+        counters.load_ms += (time.perf_counter() - started) * 1000
+
+def snapshot_version(filepath):
+    """Version of the latest snapshot of a file (increases with every save)."""
+    return read_snapshot(filepath).version
 
 # Load JSON data safely from a file
 def load_json_safe(filepath):
-    """Load JSON data from a file, return an empty dict if the file doesn't exist or is empty."""
-    # Check if the file exists, if not, create it
-    if not os.path.exists(filepath):
-        with open(filepath, 'w') as f:
-            json.dump({}, f)  # Initialize with an empty dictionary
-    
-    # Now load the file
-    with open(filepath, "r") as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return {}  # Return an empty dict if the JSON is invalid
+    """Load a private, modifiable copy of a JSON file (for read-modify-write); empty files give {}."""
+    started = time.perf_counter()
+    try:
+        snapshot = read_snapshot(filepath)
+        if not hasattr(loaded_from, "versions"):
+            loaded_from.versions = {}
+        loaded_from.versions[filepath] = snapshot.version
+        return json.loads(snapshot.raw) if snapshot.raw.strip() else {}
+    finally:
+        counters = io_counters()
+        counters.loads += 1
+        counters.load_ms += (time.perf_counter() - started) * 1000
+
+def write_atomic(filepath, raw, sync=True):
+    tmp_path = f"{filepath}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(raw)
+        if sync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, filepath)
+
+class FileLock:
+    """Write lock of one file, re-entrant: threads of this process, then other processes."""
+
+    def __init__(self, filepath):
+        self.thread_lock = RLock()
+        # fcntl locks belong to the process, so the file lock is only taken by the outermost holder
+        self.process_lock = fasteners.InterProcessLock(filepath + ".lock")
+        self.depth = 0
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        if self.depth == 0:
+            try:
+                self.process_lock.acquire()
+            except BaseException:
+                self.thread_lock.release()
+                raise
+        self.depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self.depth -= 1
+        if self.depth == 0:
+            self.process_lock.release()
+        self.thread_lock.release()
+
+file_locks = {}
+file_locks_lock = Lock()
+
+def file_lock(filepath):
+    with file_locks_lock:
+        if filepath not in file_locks:
+            file_locks[filepath] = FileLock(filepath)
+        return file_locks[filepath]
+
+def write_json(filepath, data, changed, base):
+    """Write and publish `data`; the caller holds file_lock(filepath).
+
+    The save is recorded as changing only the `changed` keys if `data` is a copy of
+    `base` and `base` is still the current snapshot and what is on disk.
+    """
+    started = time.perf_counter()
+    try:
+        base_digest = None
+        if changed is not None and base is not None and snapshots.get(filepath) is base:
+            try:
+                if file_key(filepath) == base.file_key:
+                    base_digest = base.digest
+            except OSError:
+                pass
+        if base_digest is None:
+            changed = None  # does not describe the difference to the previous save
+
+        raw = json.dumps(data, indent=2).encode("utf-8")
+        digest = hashlib.sha256(raw).hexdigest()
+        checksum = digest
+        if base_digest is not None:
+            checksum += "\n" + json.dumps({"base": base_digest, "changed": sorted(changed)})
+        write_atomic(filepath, raw)
+        write_atomic(checksum_path(filepath), checksum.encode("utf-8"), sync=False)
+        publish_snapshot(
+            filepath, file_key(filepath), raw, digest, data,
+            changed=changed, base_digest=base_digest
+        )
+        for hook in save_hooks:
+            hook(filepath, data, changed)
+    finally:
+        counters = io_counters()
+        counters.saves += 1
+        counters.save_ms += (time.perf_counter() - started) * 1000
+
+@contextmanager
+def locked(filepath):
+    """Hold file_lock(filepath); the wait is added to this thread's lock_wait_ms."""
+    started = time.perf_counter()
+    with file_lock(filepath):
+        io_counters().lock_wait_ms += (time.perf_counter() - started) * 1000
+        yield
 
 # Save JSON data safely to a file
-def save_json_safe(filepath, data):
-    """Save data to a JSON file safely, using a lock."""
-    with lock:
-        with open(filepath, "w") as f:
-            json.dump(data, f, indent=2)
+def save_json_safe(filepath, data, changed=None):
+    """Atomically replace a JSON file and publish `data` as its new snapshot.
+
+    `data` becomes shared with readers, so the caller must not modify it afterwards.
+    `changed` optionally names the top-level keys this save modified in the copy the
+    caller got from load_json_safe(); decoded snapshots then only rebuild those keys.
+
+    Only the write itself is locked: a concurrent writer may have saved between the
+    load and this save. Read-modify-write code should use update_json() instead.
+    """
+    with locked(filepath):
+        loaded_version = getattr(loaded_from, "versions", {}).pop(filepath, None)
+        current = snapshots.get(filepath)
+        base = current if current is not None and current.version == loaded_version else None
+        write_json(filepath, data, changed, base)
+
+class Transaction:
+    """A private copy of a JSON file (`data`) inside update_json(); save() writes it."""
+
+    def __init__(self, filepath, base):
+        self.filepath = filepath
+        self.base = base
+        self.data = json.loads(base.raw) if base.raw.strip() else {}
+
+    def save(self, changed=None):
+        """Write `data` (the file lock is still held). Do not modify `data` afterwards."""
+        write_json(self.filepath, self.data, changed, self.base)
+        self.base = snapshots.get(self.filepath)
+
+@contextmanager
+def update_json(filepath):
+    """Read-modify-write a JSON file without losing concurrent updates:
+
+        with update_json(path) as tx:
+            tx.data[key] = value
+            tx.save(changed=[key])
+
+    The write locks are held from the load until the block ends, so no other thread or
+    server can save the file in between, and code after save() still runs in write order.
+    """
+    with locked(filepath):
+        started = time.perf_counter()
+        try:
+            tx = Transaction(filepath, read_snapshot(filepath))
+        finally:
+            counters = io_counters()
+            counters.loads += 1
+            counters.load_ms += (time.perf_counter() - started) * 1000
+        yield tx
@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# The services read TASKMANAGER_DATA_DIR when they are imported: keep test files out of the repo
+os.environ.setdefault("TASKMANAGER_DATA_DIR", tempfile.mkdtemp(prefix="taskmanager-tests-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,22 @@
+from server.bulk import apply_record
+
+
+def chat_record(index, message):
+    return {"type": "chat", "task_id": "task_1", "index": index, "user_id": "user_a", "message": message}
+
+
+def test_chat_records_are_placed_by_index():
+    users, tasks = {}, {}
+    assert apply_record({"type": "task", "id": "task_1", "title": "Report", "owner_id": "user_a"}, users, tasks)
+    assert apply_record(chat_record(0, "first"), users, tasks)
+    assert apply_record(chat_record(0, "first again"), users, tasks)  # already imported
+    assert not apply_record(chat_record(2, "after a gap"), users, tasks)
+    assert apply_record(chat_record(1, "second"), users, tasks)
+    assert [msg["message"] for msg in tasks["task_1"]["chat"]] == ["first", "second"]
+
+
+def test_records_with_bad_ids_are_skipped():
+    users, tasks = {}, {}
+    assert not apply_record({"type": "user", "id": 42, "name": "alice"}, users, tasks)
+    assert not apply_record({"type": "member", "task_id": "task_9", "user_id": "user_a"}, users, tasks)
+    assert (users, tasks) == ({}, {})
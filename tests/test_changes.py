@@ -0,0 +1,63 @@
+from server.services.changes import ChangeFeed
+
+
+def make_feed(tmp_path, limit=10):
+    return ChangeFeed(str(tmp_path / "changes.jsonl"), limit)
+
+
+def test_entries_after_since(tmp_path):
+    feed = make_feed(tmp_path)
+    for i in range(5):
+        assert feed.append(task_id=f"task_{i}", op="task", members=["user_a"]) == i + 1
+    entries, current = feed.read(2)
+    assert current == 5
+    assert [entry["seq"] for entry in entries] == [3, 4, 5]
+    assert feed.read(5) == ([], 5)
+
+
+def test_resync_when_unknown_or_too_old(tmp_path):
+    feed = make_feed(tmp_path, limit=3)
+    for i in range(5):
+        feed.append(task_id="task_a", op="task", members=[])
+    assert feed.read(None) == (None, 5)
+    assert feed.read(6) == (None, 5)  # feed was reset or replaced
+    assert feed.read(1)[0] is None  # seqs 1-2 were dropped
+    assert [entry["seq"] for entry in feed.read(2)[0]] == [3, 4, 5]
+
+
+def test_reset_entry_forces_resync(tmp_path):
+    feed = make_feed(tmp_path)
+    feed.append(task_id="task_a", op="task", members=[])
+    feed.append(op="reset", members=[])
+    assert feed.read(1)[0] is None
+    assert feed.read(2) == ([], 2)
+
+
+def test_other_servers_see_appends(tmp_path):
+    feed = make_feed(tmp_path)
+    other = make_feed(tmp_path)
+    feed.append(task_id="task_a", op="task", members=[])
+    assert other.append(task_id="task_b", op="task", members=[]) == 2
+    assert [entry["task_id"] for entry in feed.read(0)[0]] == ["task_a", "task_b"]
+
+
+def test_partial_line_is_skipped(tmp_path):
+    feed = make_feed(tmp_path)
+    feed.append(task_id="task_a", op="task", members=[])
+    with open(feed.path, "ab") as f:
+        f.write(b'{"seq": 2, "task_')  # a writer crashed mid-line
+    assert feed.read(1) == ([], 1)
+    assert feed.append(task_id="task_b", op="task", members=[]) == 2
+    assert [entry["task_id"] for entry in make_feed(tmp_path).read(0)[0]] == ["task_a", "task_b"]
+
+
+def test_compaction_keeps_the_newest_entries(tmp_path):
+    feed = make_feed(tmp_path, limit=3)
+    for i in range(7):
+        feed.append(task_id=f"task_{i}", op="task", members=[])
+    with open(feed.path, "rb") as f:
+        assert len(f.read().splitlines()) <= 6
+    fresh = make_feed(tmp_path, limit=3)
+    entries, current = fresh.read(4)
+    assert current == 7
+    assert [entry["task_id"] for entry in entries] == ["task_4", "task_5", "task_6"]
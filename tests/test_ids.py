@@ -0,0 +1,49 @@
+import time
+
+import pytest
+
+from server.services import utils
+
+
+def test_ids_sort_in_creation_order():
+    ids = [utils.generate_id("task") for _ in range(5000)]
+    assert len(set(ids)) == len(ids)
+    assert ids == sorted(ids)
+
+
+def test_id_layout_and_timestamp():
+    before = time.time()
+    item_id = utils.generate_id("user")
+    prefix, _, body = item_id.rpartition("_")
+    assert prefix == "user"
+    assert len(body) == 18
+    assert before - 1 <= utils.id_timestamp(item_id) <= time.time() + 1
+
+
+def test_node_id_separates_servers(monkeypatch):
+    monkeypatch.setattr(utils, "node_id", 0)
+    first = utils.generate_id()
+    utils.set_node_id(1)
+    second = utils.generate_id()
+    assert first[-6:-3] == "000"
+    assert second[-6:-3] == "001"
+
+
+@pytest.mark.parametrize("value", [-1, utils.MAX_NODE_ID + 1, 5000])
+def test_node_id_out_of_range_is_rejected(monkeypatch, value):
+    monkeypatch.setattr(utils, "node_id", 7)
+    with pytest.raises(ValueError):
+        utils.set_node_id(value)
+    assert utils.node_id == 7
+
+
+def test_legacy_ids_have_no_timestamp():
+    assert utils.id_timestamp("task_1234") is None
+    assert utils.id_timestamp("user_zzzzzzzzzzzzzzzzzz") is None
+
+
+def test_unique_id_skips_existing(monkeypatch):
+    taken = utils.generate_id("task")
+    generated = iter([taken, "task_new"])
+    monkeypatch.setattr(utils, "generate_id", lambda prefix: next(generated))
+    assert utils.generate_unique_id({taken: {}}, "task") == "task_new"
@@ -0,0 +1,28 @@
+from server.services.rate_limit import RateLimiter, TokenBucket
+
+
+def test_bucket_allows_burst_then_reports_wait():
+    bucket = TokenBucket(rate=2.0, burst=3)
+    bucket.updated = 0.0
+    assert [bucket.take(0.0) for _ in range(3)] == [0, 0, 0]
+    assert bucket.take(0.0) == 0.5  # one token takes 1 / rate seconds
+
+
+def test_bucket_refills_up_to_burst():
+    bucket = TokenBucket(rate=1.0, burst=2)
+    bucket.updated = 0.0
+    bucket.take(0.0)
+    bucket.take(0.0)
+    assert bucket.take(0.5) == 0.5
+    assert bucket.take(100.0) == 0
+    assert bucket.tokens == 1  # capped at burst, minus the token just taken
+
+
+def test_limiter_keeps_separate_buckets_per_client_and_route():
+    limiter = RateLimiter({"chat": (1.0, 1)}, default_limit=(1.0, 2))
+    assert limiter.check("a", "chat") == 0
+    assert limiter.check("a", "chat") > 0
+    assert limiter.check("b", "chat") == 0
+    assert limiter.check("a", "other") == 0
+    assert limiter.check("a", "other") == 0
+    assert limiter.check("a", "other") > 0
@@ -0,0 +1,136 @@
+import json
+import os
+
+import pytest
+
+from server.services import utils
+from server.services.records import TaskRecord, decode_tasks, encode_time, decode_time
+
+REPO_TASK_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "db", "tasks.json")
+
+
+def make_task(owner="user_a", members=("user_a",), messages=0):
+    return {
+        "title": "Write report",
+        "owner_id": owner,
+        "status": "Pending",
+        "members": list(members),
+        "chat": [
+            {"user_id": owner, "username": "alice", "message": f"message {i}", "timestamp": "2025-03-01 10:00:0%d" % (i % 10)}
+            for i in range(messages)
+        ],
+    }
+
+
+def test_round_trip_of_repository_tasks():
+    with open(REPO_TASK_DB, "r", encoding="utf-8") as f:
+        tasks = json.load(f)
+    records = decode_tasks(tasks)
+    assert list(records) == list(tasks)
+    assert {task_id: record.to_dict() for task_id, record in records.items()} == tasks
+
+
+def test_round_trip_keeps_unusual_timestamps():
+    task = make_task()
+    task["chat"] = [
+        {"user_id": "user_a", "username": "alice", "message": "a", "timestamp": "2025-03-01T10:00:00"},
+        {"user_id": "user_a", "username": "alice", "message": "b", "timestamp": "yesterday"},
+        {"user_id": "user_a", "username": "alice", "message": "c", "timestamp": ""},
+    ]
+    assert TaskRecord.from_dict(task).to_dict() == task
+
+
+@pytest.mark.parametrize("timestamp", ["2025-03-01 10:00:00", "1970-01-01 00:00:00", "2099-12-31 23:59:59"])
+def test_timestamps_encode_to_epoch_seconds(timestamp):
+    assert decode_time(encode_time(timestamp)) == timestamp
+
+
+@pytest.mark.parametrize("task", [
+    {"title": 4, "owner_id": 5, "status": 3, "members": [5, None], "chat": [{"user_id": 5, "username": 9, "timestamp": 7}]},
+    {"members": 5, "chat": "not a list"},
+    {},
+])
+def test_odd_tasks_decode_without_error(task):
+    record = TaskRecord.from_dict(task)
+    assert isinstance(record.to_dict()["members"], list)
+    json.dumps(record.to_dict())
+
+
+def test_non_object_tasks_are_skipped_not_fatal():
+    records = decode_tasks({"good": make_task(), "bad": ["not", "a", "task"]})
+    assert list(records) == ["good"]
+
+
+def test_membership_lookup():
+    record = TaskRecord.from_dict(make_task(members=["user_a", "user_b"]))
+    assert record.has_member("user_b")
+    assert not record.has_member("user_never_seen")
+    assert not record.has_member(5)
+    assert record.member_ids() == ["user_a", "user_b"]
+    assert record.owner_id == "user_a"
+
+
+def test_chat_slices_from_index():
+    record = TaskRecord.from_dict(make_task(messages=5))
+    assert len(record.chat) == 5
+    assert [m["message"] for m in record.chat.to_list(3)] == ["message 3", "message 4"]
+
+
+def test_incremental_decode_matches_full_decode():
+    tasks = {f"task_{i}": make_task(messages=2) for i in range(5)}
+    base = decode_tasks(tasks)
+
+    tasks["task_1"]["members"].append("user_b")
+    tasks["task_new"] = make_task(owner="user_c", members=["user_c"])
+    del tasks["task_3"]
+    records = decode_tasks(tasks, base, {"task_1", "task_3", "task_new"})
+
+    assert list(records) == list(decode_tasks(tasks))
+    assert {k: r.to_dict() for k, r in records.items()} == tasks
+    assert records["task_0"] is base["task_0"]  # unchanged records are shared
+    assert not base["task_1"].has_member("user_b")  # the previous snapshot is untouched
+
+
+def test_snapshot_decodes_only_changed_keys(tmp_path):
+    path = str(tmp_path / "tasks.json")
+    calls = []
+
+    def decode(document, base=None, changed=None):
+        calls.append(None if base is None else set(changed))
+        return decode_tasks(document, base, changed)
+
+    utils.register_snapshot_decoder(path, decode)
+    utils.save_json_safe(path, {"task_1": make_task(), "task_2": make_task()})
+    utils.load_json_snapshot(path)
+
+    tasks = utils.load_json_safe(path)
+    tasks["task_2"]["status"] = "Done"
+    utils.save_json_safe(path, tasks, changed=["task_2"])
+    records = utils.load_json_snapshot(path)
+
+    assert calls == [None, {"task_2"}]
+    assert records["task_2"].status == "Done"
+
+
+def test_snapshot_falls_back_to_full_decode_for_stale_copies(tmp_path):
+    path = str(tmp_path / "tasks.json")
+    calls = []
+
+    def decode(document, base=None, changed=None):
+        calls.append(None if base is None else set(changed))
+        return decode_tasks(document, base, changed)
+
+    utils.register_snapshot_decoder(path, decode)
+    utils.save_json_safe(path, {"task_1": make_task(), "task_2": make_task()})
+    stale = utils.load_json_safe(path)
+
+    fresh = utils.load_json_safe(path)
+    fresh["task_1"]["status"] = "Done"
+    utils.save_json_safe(path, fresh, changed=["task_1"])
+
+    # A copy loaded before another save is not decoded on top of that save
+    stale["task_2"]["status"] = "In Progress"
+    utils.save_json_safe(path, stale, changed=["task_2"])
+    utils.load_json_snapshot(path)
+
+    assert calls == [None]
@@ -0,0 +1,76 @@
+from server.services.replication import MutationLog
+from server.services import utils
+from server.services.utils import data_path
+
+PATH = data_path("db", "example.json")
+
+
+def test_record_logs_set_and_deleted_keys():
+    log = MutationLog()
+    log.record(PATH, {"a": 1, "b": {"x": 1}})
+    log.record(PATH, {"a": 1, "b": {"x": 2}, "c": 3})
+    log.record(PATH, {"b": {"x": 2}, "c": 3})
+
+    entries = log.since(0)
+    assert [e["seq"] for e in entries] == [1, 2, 3]
+    assert entries[0]["set"] == {"a": 1, "b": {"x": 1}}
+    assert (entries[1]["set"], entries[1]["delete"]) == ({"b": {"x": 2}, "c": 3}, [])
+    assert (entries[2]["set"], entries[2]["delete"]) == ({}, ["a"])
+    assert entries[0]["file"] == "db/example.json"
+
+
+def test_unchanged_save_is_not_logged():
+    log = MutationLog()
+    log.record(PATH, {"a": [1, 2]})
+    log.record(PATH, {"a": [1, 2]})
+    assert log.seq == 1
+
+
+def test_key_order_does_not_count_as_change():
+    log = MutationLog()
+    log.record(PATH, {"a": {"x": 1, "y": 2}})
+    log.record(PATH, {"a": {"y": 2, "x": 1}})
+    assert log.seq == 1
+
+
+def test_since_requests_resync_outside_the_log():
+    log = MutationLog()
+    log.record(PATH, {"a": 1})
+    assert log.since(1) == []
+    assert log.since(2) is None  # ahead of the primary
+
+
+def test_snapshot_contains_latest_documents():
+    log = MutationLog()
+    log.record(PATH, {"a": 1})
+    log.record(PATH, {"a": 2})
+    snapshot = log.snapshot()
+    assert snapshot["seq"] == 2
+    assert snapshot["files"] == {"db/example.json": {"a": 2}}
+
+
+def test_only_changed_keys_are_compared():
+    log = MutationLog()
+    log.record(PATH, {"a": 1, "b": 2}, changed=None)
+    # "b" differs but was not named as changed: not compared, not logged
+    log.record(PATH, {"a": 3, "b": 5}, changed=["a"])
+    log.record(PATH, {"b": 5}, changed=["a", "b"])
+
+    entries = log.since(1)
+    assert (entries[0]["set"], entries[0]["delete"]) == ({"a": 3}, [])
+    assert (entries[1]["set"], entries[1]["delete"]) == ({"b": 5}, ["a"])
+    assert log.snapshot()["files"] == {"db/example.json": {"b": 5}}
+
+
+def test_saves_pass_changed_keys_to_hooks(tmp_path, monkeypatch):
+    path = str(tmp_path / "tasks.json")
+    calls = []
+    monkeypatch.setattr(utils, "save_hooks", [lambda filepath, data, changed: calls.append(changed)])
+    utils.save_json_safe(path, {"a": 1})
+    with utils.update_json(path) as tx:
+        tx.data["b"] = 2
+        tx.save(changed=["b"])
+    stale = utils.load_json_safe(path)
+    utils.save_json_safe(path, {"a": 1, "b": 2, "c": 3})
+    utils.save_json_safe(path, stale, changed=["a"])  # loaded before the last save: full diff
+    assert calls == [None, ["b"], None, None]
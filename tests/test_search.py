@@ -0,0 +1,80 @@
+from server.services import search
+from server.services.records import TASK_DB
+from server.services.search import SearchIndex, tokenize
+from server.services.utils import save_json_safe
+
+
+def build_index():
+    index = SearchIndex()
+    index.loaded = True  # built by hand instead of from the task DB
+    index.add_task("task_1", "Quarterly report", ["alice", "bob"])
+    index.add_task("task_2", "Report report draft", ["alice"])
+    index.add_task("task_3", "Holiday plans", ["carol"])
+    index.add_message("task_1", 0, {"message": "report due friday", "user_id": "bob", "username": "bob", "timestamp": ""})
+    index.add_message("task_3", 0, {"message": "report on holiday budget", "user_id": "carol", "username": "carol", "timestamp": ""})
+    return index
+
+
+def test_tokenize():
+    assert tokenize("Hello, World! 42") == ["hello", "world", "42"]
+    assert tokenize(None) == []
+
+
+def test_higher_term_frequency_ranks_first():
+    hits, total = build_index().search("report", "alice")
+    assert total == 3
+    assert hits[0]["task_id"] == "task_2"
+
+
+def test_rarer_terms_weigh_more():
+    hits, _ = build_index().search("report friday", "bob")
+    assert (hits[0]["type"], hits[0]["task_id"]) == ("message", "task_1")
+
+
+def test_only_member_tasks_are_searched():
+    index = build_index()
+    hits, total = index.search("holiday", "alice")
+    assert (hits, total) == ([], 0)
+    hits, total = index.search("report", "carol")
+    assert total == 1
+    assert hits[0]["task_id"] == "task_3"
+
+
+def test_membership_changes_update_results():
+    index = build_index()
+    index.on_event("task.changed", {"task_id": "task_1", "title": "Quarterly report", "members": ["alice"]})
+    _, total = index.search("report", "bob")
+    assert total == 0
+
+
+def test_paging():
+    index = build_index()
+    first, total = index.search("report", "alice", offset=0, limit=2)
+    rest, _ = index.search("report", "alice", offset=2, limit=2)
+    assert total == 3
+    assert len(first) == 2 and len(rest) == 1
+    assert {h["task_id"] for h in first + rest} == {"task_1", "task_2"}
+
+
+def test_retitled_task_drops_old_terms():
+    index = build_index()
+    index.on_event("task.changed", {"task_id": "task_2", "title": "Budget", "members": ["alice"]})
+    hits, _ = index.search("draft", "alice")
+    assert hits == []
+    assert "draft" not in index.doc_freq
+
+
+def test_index_is_rebuilt_from_the_snapshot(monkeypatch):
+    task = {"title": "Quarterly report", "owner_id": "alice", "status": "Pending", "members": ["alice"], "chat": []}
+    save_json_safe(TASK_DB, {"task_1": task})
+    index = SearchIndex()
+    assert index.search("report", "alice")[1] == 1
+    # An event for a write that never reached the DB
+    index.on_event("task.created", {"task_id": "task_2", "title": "Report draft", "members": ["alice"]})
+    assert index.search("report", "alice")[1] == 2
+
+    monkeypatch.setattr(search, "REBUILD_EVERY", 1)
+    save_json_safe(TASK_DB, {"task_1": task})
+    hits, total = index.search("report", "alice")
+    assert total == 1
+    assert hits[0]["task_id"] == "task_1"
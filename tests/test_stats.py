@@ -0,0 +1,34 @@
+from server.services import stats
+from server.services.records import TASK_DB
+from server.services.stats import TaskStats
+from server.services.utils import save_json_safe
+
+
+def make_task(status="Pending", members=("user_a",)):
+    return {"title": "Write report", "owner_id": "user_a", "status": status, "members": list(members), "chat": []}
+
+
+def test_counters_follow_events():
+    save_json_safe(TASK_DB, {"task_1": make_task()})
+    task_stats = TaskStats()
+    assert task_stats.system_stats() == {"tasks": 1, "by_status": {"Pending": 1}, "messages": 0}
+
+    task_stats.on_event("task.changed", {"task_id": "task_1", "owner_id": "user_a", "status": "Done", "members": ["user_a", "user_b"]})
+    task_stats.on_event("chat.sent", {"task_id": "task_1", "index": 1})
+    assert task_stats.system_stats() == {"tasks": 1, "by_status": {"Done": 1}, "messages": 2}
+    assert task_stats.user_stats("user_b") == {"owned": {}, "member": {"Done": 1}, "chat_counts": {"task_1": 2}}
+
+
+def test_counters_are_rebuilt_from_the_snapshot(monkeypatch):
+    save_json_safe(TASK_DB, {"task_1": make_task()})
+    task_stats = TaskStats()
+    task_stats.system_stats()
+    # An event for a write that never reached the DB
+    task_stats.on_event("task.created", {"task_id": "task_2", "owner_id": "user_a", "status": "Pending", "members": ["user_a"]})
+    assert task_stats.system_stats()["tasks"] == 2
+
+    monkeypatch.setattr(stats, "REBUILD_EVERY", 2)
+    save_json_safe(TASK_DB, {"task_1": make_task("Done")})
+    assert task_stats.system_stats()["tasks"] == 2  # one save since the build
+    save_json_safe(TASK_DB, {"task_1": make_task("Done")})
+    assert task_stats.system_stats() == {"tasks": 1, "by_status": {"Done": 1}, "messages": 0}
@@ -0,0 +1,44 @@
+import threading
+
+from server.services import utils
+
+
+def test_concurrent_updates_are_not_lost(tmp_path):
+    path = str(tmp_path / "tasks.json")
+    utils.save_json_safe(path, {})
+
+    def create(worker):
+        for i in range(10):
+            with utils.update_json(path) as tx:
+                key = f"{worker}-{i}"
+                tx.data[key] = {"title": key}
+                tx.save(changed=[key])
+
+    threads = [threading.Thread(target=create, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(utils.load_json_safe(path)) == 80
+    assert utils.snapshot_version(path) == 81
+
+
+def test_update_without_save_leaves_the_file_alone(tmp_path):
+    path = str(tmp_path / "users.json")
+    utils.save_json_safe(path, {"user_a": {"name": "alice"}})
+    version = utils.snapshot_version(path)
+
+    with utils.update_json(path) as tx:
+        tx.data["user_b"] = {"name": "bob"}
+
+    assert utils.snapshot_version(path) == version
+    assert utils.load_json_safe(path) == {"user_a": {"name": "alice"}}
+
+
+def test_update_creates_a_missing_file(tmp_path):
+    path = str(tmp_path / "new.json")
+    with utils.update_json(path) as tx:
+        tx.data["key"] = 1
+        tx.save()
+    assert utils.load_json_safe(path) == {"key": 1}